@@ -0,0 +1,317 @@
+import os
+import csv
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import tempfile
+import itertools
+import threading
+import google.generativeai as genai
+from json_extract import extract_json_object
+from request_scheduler import HTTPStatusError
+
+# Select the backend with ARIA_BACKEND=gemini (default) or ARIA_BACKEND=fake
+BACKEND_ENV = "ARIA_BACKEND"
+DEFAULT_FAKE_RESPONSES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "result_gemini-2.0-flash-exp", "gemini_output.csv")
+# Fake runs keep caches and results under this folder (default: a new temporary folder per process)
+FAKE_RUN_DIR_ENV = "ARIA_FAKE_RUN_DIR"
+_fake_run_dir = None
+
+def backend_name():
+    """Returns the name of the backend selected by ARIA_BACKEND ("gemini" or "fake")."""
+    return "fake" if os.environ.get(BACKEND_ENV, "gemini") == "fake" else "gemini"
+
+def run_path(path):
+    """
+    Returns path for the real backend. Under the fake backend returns the same path
+    below the fake run folder, so fake runs never read or write production caches,
+    manifests and results.
+    """
+    global _fake_run_dir
+    if backend_name() != "fake":
+        return path
+    if _fake_run_dir is None:
+        _fake_run_dir = os.environ.get(FAKE_RUN_DIR_ENV) or tempfile.mkdtemp(prefix="aria_fake_run_")
+        logging.info(f"Fake backend run: caches and results are kept under {_fake_run_dir}")
+    return os.path.join(_fake_run_dir, os.path.abspath(os.path.expanduser(path)).lstrip(os.sep))
+
+# Explicit context caching: the API rejects contents below this many tokens and models without a stable version
+CACHE_MIN_TOKENS = 32768
+CACHEABLE_MODELS = {"gemini-1.5-flash-001", "gemini-1.5-flash-002", "gemini-1.5-pro-001", "gemini-1.5-pro-002", "gemini-2.0-flash-001"}
+
+def cache_rejection(model_name, contents):
+    """Returns why contents cannot be stored as cached content for a model, or None if they can."""
+    if model_name.split("/")[-1] not in CACHEABLE_MODELS:
+        return f"{model_name} does not support explicit caching"
+    tokens = sum(len(str(content)) for content in contents) // 4
+    if tokens < CACHE_MIN_TOKENS:
+        return f"~{tokens} tokens is below the {CACHE_MIN_TOKENS}-token caching minimum"
+    return None
+
+class GeminiBackend:
+    """Thin layer over google.generativeai so the pipeline can run against other backends."""
+    name = "gemini"
+
+    def upload_file(self, path, mime_type=None):
+        return genai.upload_file(path, mime_type=mime_type)
+
+    def get_file(self, name):
+        return genai.get_file(name)
+
+    def start_chat(self, model, history):
+        return model.start_chat(history=history)
+
+    def generate_content(self, model, contents, **kwargs):
+        return model.generate_content(contents, **kwargs)
+
+    def cache_context(self, model_name, contents, ttl, generation_config=None):
+        """
+        Stores contents as cached content; returns (a model that uses it, the cache handle with delete()).
+        Raises ValueError without calling the API if the model or the size cannot be cached.
+        """
+        rejection = cache_rejection(model_name, contents)
+        if rejection:
+            raise ValueError(f"Cannot cache context: {rejection}")
+        cache = genai.caching.CachedContent.create(model=model_name, contents=contents, ttl=ttl)
+        return genai.GenerativeModel.from_cached_content(cached_content=cache, generation_config=generation_config), cache
+
+class FakeRateLimitError(Exception):
+    """Raised by the fake backend to simulate an HTTP 429 from the model endpoint."""
+    code = 429
+
+    def __init__(self, retry_after):
+        super().__init__(f"429 Resource has been exhausted (retry after {retry_after:.1f}s)")
+        self.retry_after = retry_after
+
+class FakeServerError(Exception):
+    """Raised by the fake backend to simulate a transient 5xx from the model endpoint."""
+    code = 503
+
+class _FakeState:
+    def __init__(self, name):
+        self.name = name
+
+class FakeFile:
+    def __init__(self, name, display_name, ready_at):
+        self.name = name
+        self.display_name = display_name
+        self.uri = f"fake://{name}"
+        self.ready_at = ready_at
+        self.expiration_time = None
+
+    @property
+    def state(self):
+        return _FakeState("ACTIVE" if time.monotonic() >= self.ready_at else "PROCESSING")
+
+class FakeCachedContent:
+    def __init__(self, name, model_name, contents):
+        self.name = name
+        self.model = model_name
+        self.contents = list(contents)
+        self.deleted = False
+
+    def delete(self):
+        self.deleted = True
+
+class FakeCachedModel:
+    """Model bound to fake cached content; chats on it are not charged for the cached contents."""
+    def __init__(self, model_name, cached_content, generation_config=None):
+        self.model_name = model_name
+        self.cached_content = cached_content
+        self._generation_config = generation_config or {}
+
+class _FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+class FakeResponse:
+    def __init__(self, text, prompt_text=""):
+        self.text = text
+        self.usage_metadata = _FakeUsage(len(prompt_text) // 4, len(text) // 4)
+
+class _FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeStreamResponse(FakeResponse):
+    """Streamed fake response; iterating yields the text in chunks of chunk_size characters."""
+    def __init__(self, text, prompt_text="", chunk_size=256):
+        super().__init__(text, prompt_text)
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for start in range(0, len(self.text), self.chunk_size):
+            yield _FakeChunk(self.text[start:start + self.chunk_size])
+
+def _json_mode(model):
+    config = getattr(model, "_generation_config", None) or {}
+    return config.get("response_mime_type") == "application/json"
+
+def as_json_response(text):
+    """Converts a canned text-mode response to what JSON output mode would return (the tool object plus the summary)."""
+    document = extract_json_object(text, required_key="tools") or {"video_name": "Unknown Video", "tools": []}
+    start = text.find("Task Summary:")
+    end = text.find("End Summary.", start)
+    document["task_summary"] = text[start:end + len("End Summary.")] if start >= 0 and end >= 0 else ""
+    return json.dumps(document, ensure_ascii=False)
+
+class FakeChatSession:
+    def __init__(self, backend, history, json_mode=False):
+        self.backend = backend
+        self.history = list(history)
+        self.json_mode = json_mode
+
+    def send_message(self, content, stream=False, **kwargs):
+        prompt_text = "".join(str(p) for h in self.history for p in h.get("parts", []) if isinstance(p, str)) + str(content)
+        response = self.backend._respond(prompt_text)
+        if self.json_mode:
+            response = FakeResponse(as_json_response(response.text), prompt_text)
+        if stream:
+            response = FakeStreamResponse(response.text, prompt_text)
+        self.history.append({"role": "user", "parts": [content]})
+        self.history.append({"role": "model", "parts": [response.text]})
+        return response
+
+def load_canned_responses(path):
+    """
+    Loads canned model responses from a gemini_output.csv (response_text column)
+    or from a tool JSON file such as updated_tools_info.json (one response per video_name).
+    """
+    if path.endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        tools = data.get("tools", []) if isinstance(data, dict) else data
+        by_video = {}
+        for tool in tools:
+            by_video.setdefault(tool.get("video_name", "Unknown Video"), []).append(tool)
+        return [
+            "```json\n" + json.dumps({"video_name": video_name, "tools": video_tools}, indent=4) + "\n```"
+            for video_name, video_tools in by_video.items()
+        ]
+
+    csv.field_size_limit(sys.maxsize)
+    responses = []
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[0] != "timestamp" and row[1].strip():
+                responses.append(row[1])
+    return responses
+
+class FakeBackend:
+    """
+    Local stand-in for the Gemini and Mistral endpoints.
+    Replays canned responses round-robin with configurable latency, file
+    processing time, error rate and 429 rate, so the whole pipeline can be
+    load-tested without network access.
+    """
+    name = "fake"
+
+    def __init__(self, responses, latency=0.0, processing_time=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0, seed=None):
+        if not responses:
+            raise ValueError("FakeBackend needs at least one canned response")
+        self.responses = responses
+        self.latency = latency
+        self.processing_time = processing_time
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cycle = itertools.cycle(responses)
+        self._files = {}
+        self._file_ids = itertools.count(1)
+        self._cache_ids = itertools.count(1)
+
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise FakeRateLimitError(self.retry_after)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise FakeServerError("503 The service is currently unavailable")
+
+    def _next_text(self):
+        with self._lock:
+            return next(self._cycle)
+
+    def _respond(self, prompt_text):
+        if self.latency:
+            time.sleep(self.latency)
+        self._maybe_fail()
+        return FakeResponse(self._next_text(), prompt_text)
+
+    def upload_file(self, path, mime_type=None):
+        if self.latency:
+            time.sleep(self.latency)
+        self._maybe_fail()
+        with self._lock:
+            name = f"files/fake-{next(self._file_ids)}"
+            file = FakeFile(name, os.path.basename(path), time.monotonic() + self.processing_time)
+            self._files[name] = file
+        return file
+
+    def get_file(self, name):
+        with self._lock:
+            file = self._files.get(name)
+        if file is None:
+            raise HTTPStatusError(404, f"File {name} not found")
+        return file
+
+    def start_chat(self, model, history):
+        return FakeChatSession(self, history, json_mode=_json_mode(model))
+
+    def cache_context(self, model_name, contents, ttl, generation_config=None):
+        rejection = cache_rejection(model_name, contents)
+        if rejection:
+            raise ValueError(f"Cannot cache context: {rejection}")
+        with self._lock:
+            cache = FakeCachedContent(f"cachedContents/fake-{next(self._cache_ids)}", model_name, contents)
+        return FakeCachedModel(model_name, cache, generation_config), cache
+
+    def generate_content(self, model, contents, **kwargs):
+        if not isinstance(contents, (list, tuple)):
+            contents = [contents]
+        return self._respond("".join(c for c in contents if isinstance(c, str)))
+
+    async def agent_completion(self, agent_id, question, base64_image):
+        """Fake for the Mistral agents/completions endpoint called by AgentWorkflow.perform_task; returns its JSON body."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._maybe_fail()
+        text = self._next_text()
+        return {
+            "model": "fake-mistral-agent",
+            "choices": [{"message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": len(question) // 4, "completion_tokens": len(text) // 4},
+        }
+
+def fake_backend_from_env():
+    """Builds a FakeBackend from ARIA_FAKE_* environment variables."""
+    return FakeBackend(
+        load_canned_responses(os.environ.get("ARIA_FAKE_RESPONSES", DEFAULT_FAKE_RESPONSES)),
+        latency=float(os.environ.get("ARIA_FAKE_LATENCY", "0")),
+        processing_time=float(os.environ.get("ARIA_FAKE_PROCESSING_TIME", "0")),
+        error_rate=float(os.environ.get("ARIA_FAKE_ERROR_RATE", "0")),
+        rate_limit_rate=float(os.environ.get("ARIA_FAKE_429_RATE", "0")),
+    )
+
+def get_backend():
+    """Returns the backend selected by ARIA_BACKEND for the Gemini pipeline."""
+    if backend_name() == "fake":
+        logging.info("Using the local fake model backend")
+        return fake_backend_from_env()
+    return GeminiBackend()
+
+def get_agent_backend():
+    """Returns the fake backend for the Mistral agents if ARIA_BACKEND=fake, otherwise None (real HTTP calls)."""
+    if os.environ.get(BACKEND_ENV, "gemini") == "fake":
+        logging.info("Using the local fake agent backend")
+        return fake_backend_from_env()
+    return None
@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import pandas as pd
+from tool_databank import FRAME_COLUMNS, upsert_tool_frame, ToolDatabank
+
+DEFAULT_DATABANK_ROWS = [1000, 10000, 100000]
+DEFAULT_BATCH_SIZE = 1000
+
+def legacy_update(df, new_tool_info):
+    """The per-tool mask/loc/concat loop previously used by update_databank."""
+    for tool_info in new_tool_info:
+        object_name = tool_info['object_name']
+        existing_tool = df[(df['object'] == object_name)]
+        if not existing_tool.empty:
+            df.loc[existing_tool.index, 'timestamp'] = tool_info['timestamp']
+            df.loc[existing_tool.index, 'action'] = tool_info['action']
+            df.loc[existing_tool.index, 'status'] = "Normal"
+        else:
+            new_row = {
+                'timestamp': tool_info['timestamp'],
+                'object': object_name,
+                'object_type': tool_info.get('object_type', 'Unknown'),
+                'object_color': tool_info.get('object_color', 'Unknown'),
+                'object_size': tool_info.get('object_size', 'Unknown'),
+                'action': tool_info['action'],
+                'status': "Normal",
+                'location': "Unknown"
+            }
+            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+    return df
+
+def make_databank(rows):
+    """Builds a databank frame with rows distinct objects."""
+    return pd.DataFrame({
+        'timestamp': [f"{i // 60}:{i % 60:02d}" for i in range(rows)],
+        'object': [f"Tool {i}" for i in range(rows)],
+        'object_type': "Tool",
+        'object_color': "Red",
+        'object_size': "Approximately 15 cm long",
+        'action': "Holding the tool",
+        'status': "Normal",
+        'location': "Unknown",
+    }, columns=FRAME_COLUMNS)
+
+def make_batch(rows, batch_size):
+    """Builds batch_size tool records, half for known objects and half for new ones."""
+    return [
+        {
+            "object_name": f"Tool {i * 2 if i % 2 else rows + i}",
+            "object_type": "Tool",
+            "object_color": "Blue",
+            "object_size": "Approximately 20 cm long",
+            "action": f"Using the tool {i}",
+            "timestamp": f"0:{i % 60:02d}",
+        }
+        for i in range(batch_size)
+    ]
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def run_benchmark(rows, batch_size, work_dir, skip_legacy):
+    """Times one batch upsert into a databank of the given size with each implementation."""
+    batch = make_batch(rows, batch_size)
+    result = {"databank_rows": rows, "batch_size": batch_size}
+
+    if not skip_legacy:
+        seconds, df = timed(legacy_update, make_databank(rows), batch)
+        result["legacy_loop_s"] = seconds
+        legacy_rows = len(df)
+
+    seconds, (df, inserted, updated) = timed(upsert_tool_frame, make_databank(rows), batch)
+    result["frame_merge_s"] = seconds
+    result["inserted"], result["updated"] = inserted, updated
+    if not skip_legacy and legacy_rows != len(df):
+        raise RuntimeError(f"Legacy loop and frame merge disagree: {legacy_rows} vs {len(df)} rows")
+
+    databank = ToolDatabank(os.path.join(work_dir, f"databank_{rows}.sqlite"))
+    databank.upsert_tools(make_databank(rows).rename(columns={"object": "object_name"}))
+    seconds, _ = timed(databank.upsert_tools, batch)
+    result["sqlite_upsert_s"] = seconds
+    seconds, _ = timed(databank.append_events, batch)
+    result["sqlite_append_s"] = seconds
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of databank batch upserts: per-tool loop vs keyed frame merge vs SQLite.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_DATABANK_ROWS, help="Databank sizes to benchmark.")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_SIZE, help="Tool records upserted per call.")
+    parser.add_argument("--skip-legacy", action="store_true", help="Do not time the per-tool loop (slow for large databanks).")
+    parser.add_argument("--output", default=None, help="Optional machine-readable results file.")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="aria_databank_bench_")
+    results = {"python": sys.version.split()[0], "pandas": pd.__version__, "runs": []}
+    for rows in args.rows:
+        run = run_benchmark(rows, args.batch, work_dir, args.skip_legacy)
+        results["runs"].append(run)
+        legacy = f"{run['legacy_loop_s'] * 1000:10.1f} ms" if "legacy_loop_s" in run else "   skipped"
+        print(
+            f"{rows:>7} rows, {args.batch} records: legacy loop {legacy}  frame merge {run['frame_merge_s'] * 1000:8.1f} ms  "
+            f"sqlite {run['sqlite_upsert_s'] * 1000:8.1f} ms  sqlite append {run['sqlite_append_s'] * 1000:8.1f} ms  "
+            f"({run['inserted']} inserted, {run['updated']} updated)"
+        )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Benchmark results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
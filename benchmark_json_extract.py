@@ -0,0 +1,71 @@
+import re
+import sys
+import json
+import time
+import argparse
+from backends import load_canned_responses, DEFAULT_FAKE_RESPONSES
+from json_extract import extract_json_object
+
+def legacy_extract(response_text):
+    """The greedy regex extraction previously used by parse_tool_json and gemini.main."""
+    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+    if not json_match:
+        return None
+    return json.loads(json_match.group(0).replace('""', ' '))
+
+def time_extractor(extract, responses, repeat):
+    """Returns (best seconds per pass over all responses, number of responses decoded, tools found)."""
+    decoded, tools = 0, 0
+    for response_text in responses:
+        try:
+            document = extract(response_text)
+        except Exception:
+            document = None
+        if isinstance(document, dict):
+            decoded += 1
+            tools += len(document.get("tools", []))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for response_text in responses:
+            try:
+                extract(response_text)
+            except Exception:
+                pass
+        best = min(best, time.perf_counter() - start)
+    return best, decoded, tools
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark of tool JSON extraction on stored Gemini responses.")
+    parser.add_argument("--responses", default=DEFAULT_FAKE_RESPONSES, help="gemini_output.csv (or tool JSON) with stored responses.")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed passes per extractor (best is reported).")
+    parser.add_argument("--scale", type=int, default=1, help="Also time responses concatenated this many times (long-response case).")
+    parser.add_argument("--output", default=None, help="Optional machine-readable results file.")
+    args = parser.parse_args(argv)
+
+    responses = load_canned_responses(args.responses)
+    cases = {"stored": responses}
+    if args.scale > 1:
+        cases[f"stored_x{args.scale}"] = ["\n".join([r] * args.scale) for r in responses]
+
+    extractors = {
+        "legacy_regex": legacy_extract,
+        "json_extract": lambda text: extract_json_object(text, required_key="tools"),
+    }
+    results = {"python": sys.version.split()[0], "responses": len(responses), "repeat": args.repeat, "cases": {}}
+    for case, texts in cases.items():
+        chars = sum(len(t) for t in texts)
+        print(f"{case}: {len(texts)} responses, {chars} characters")
+        results["cases"][case] = {}
+        for name, extract in extractors.items():
+            seconds, decoded, tools = time_extractor(extract, texts, args.repeat)
+            results["cases"][case][name] = {"seconds_per_pass": seconds, "decoded": decoded, "tools": tools}
+            print(f"  {name:<14} {seconds * 1000:9.3f} ms/pass  {chars / seconds / 1e6:8.1f} MB/s  decoded {decoded}/{len(texts)}, {tools} tools")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Benchmark results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import math
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import functools
+
+# The benchmark always runs against the local fake backend (see backends.py)
+os.environ["ARIA_BACKEND"] = "fake"
+
+# extract_summary imports gemini_tools (and vice versa), so it has to be imported first
+import extract_summary
+import gemini_tools
+import gemini_files
+from file_poller import FilePoller
+from upload_cache import UploadCache
+from run_manifest import RunManifest
+from tool_databank import ToolDatabank
+from result_sink import ResultSink
+from request_scheduler import RequestScheduler
+from stream_parser import ToolRecordStream
+
+STAGES = [
+    "folder_scan",
+    "upload",
+    "time_to_active",
+    "generation",
+    "json_extraction",
+    "update_databank",
+    "save_gemini_output",
+    "extract_summary",
+]
+DEFAULT_CLIP_COUNTS = [10, 100, 1000]
+SYNTHETIC_CLIP_BYTES = 64 * 1024
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+class StageTimer:
+    """Collects wall-clock samples per pipeline stage (thread-safe)."""
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        return {
+            stage: {
+                "count": len(values),
+                "p50_s": percentile(values, 50),
+                "p95_s": percentile(values, 95),
+                "p99_s": percentile(values, 99),
+                "total_s": sum(values),
+            }
+            for stage, values in self.samples.items()
+        }
+
+def _timed_consume_stream(consume_stream, timer):
+    """
+    Wraps consume_stream so that the time spent in ToolRecordStream.feed for a
+    response is recorded as one json_extraction sample (the rest of the call
+    waits for chunks and belongs to generation).
+    """
+    original_feed = ToolRecordStream.feed
+
+    def timed(response, tool_stream, *args, **kwargs):
+        spent = [0.0]
+
+        def feed(chunk):
+            start = time.perf_counter()
+            try:
+                return original_feed(tool_stream, chunk)
+            finally:
+                spent[0] += time.perf_counter() - start
+
+        tool_stream.feed = feed
+        try:
+            return consume_stream(response, tool_stream, *args, **kwargs)
+        finally:
+            del tool_stream.feed
+            timer.record("json_extraction", spent[0])
+    return timed
+
+class _TimedChatSession:
+    def __init__(self, chat_session, timer):
+        self._chat_session = chat_session
+        self._timer = timer
+
+    def send_message(self, *args, **kwargs):
+        return self._timer.wrap("generation", self._chat_session.send_message)(*args, **kwargs)
+
+def make_synthetic_clips(folder, count, size=SYNTHETIC_CLIP_BYTES):
+    """Writes count small clip_N.mp4 files with distinct content."""
+    os.makedirs(folder, exist_ok=True)
+    for i in range(1, count + 1):
+        with open(os.path.join(folder, f"clip_{i}.mp4"), 'wb') as f:
+            f.write(hashlib.sha256(str(i).encode()).digest() * (size // 32))
+
+def run_benchmark(clip_count, work_dir, max_workers):
+    """Runs the clip pipeline end to end on synthetic clips and returns per-stage latency percentiles."""
+    run_dir = os.path.join(work_dir, f"clips_{clip_count}")
+    video_folder = os.path.join(run_dir, "video")
+    result_folder = os.path.join(run_dir, "result")
+    os.makedirs(result_folder, exist_ok=True)
+    make_synthetic_clips(video_folder, clip_count)
+
+    # Point every output of the pipeline at the scratch folder
+    gemini_tools.DATABANK_FILE = os.path.join(result_folder, "tool_databank.csv")
+    gemini_tools.DATABANK_CSV_EXPORT = os.path.join(result_folder, "tool_databank_export.csv")
+    gemini_tools.DATABANK = ToolDatabank(os.path.join(result_folder, "tool_databank.sqlite"))
+    gemini_tools.CSV_FILE = os.path.join(result_folder, "gemini_output.csv")
+    gemini_tools.RESULT_SINK = ResultSink(os.path.join(result_folder, "results"), flush_every=1, fsync=True)
+    gemini_tools.RUN_MANIFEST = RunManifest(os.path.join(result_folder, "run_manifest.jsonl"))
+    gemini_tools.RESPONSE_CACHE.enabled = False
+    # Uploads go through gemini_files, which gemini_tools shares its upload manifest, poller and scheduler with.
+    # The fake backend has no quota, so measure the pipeline rather than the rate limiter.
+    upload_cache = UploadCache(os.path.join(result_folder, "upload_manifest.json"))
+    file_poller = FilePoller(gemini_tools.BACKEND.get_file)
+    scheduler = RequestScheduler(limits={"": (None, None)})
+    for module in (gemini_tools, gemini_files):
+        module.UPLOAD_CACHE = upload_cache
+        module.FILE_POLLER = file_poller
+        module.SCHEDULER = scheduler
+    extract_summary.INPUT_RESULTS_FOLDER = gemini_tools.RESULT_SINK.folder
+    extract_summary.INPUT_CSV_FILE = gemini_tools.CSV_FILE
+    extract_summary.OUTPUT_CSV_FILE = os.path.join(result_folder, "task_summaries_output.csv")
+    extract_summary.CHECKPOINT_FILE = os.path.join(result_folder, "task_summaries_checkpoint.json")
+
+    timer = StageTimer()
+    backend = gemini_tools.BACKEND
+    originals = {
+        "find_and_sort_mp4_files": gemini_tools.find_and_sort_mp4_files,
+        "upload_to_gemini": gemini_tools.upload_to_gemini,
+        "parse_tool_json": gemini_tools.parse_tool_json,
+        "decode_tool_response": gemini_tools.decode_tool_response,
+        "consume_stream": gemini_tools.consume_stream,
+        "update_databank": gemini_tools.update_databank,
+        "save_gemini_output": gemini_tools.save_gemini_output,
+    }
+    original_start_chat = backend.start_chat
+    try:
+        gemini_tools.find_and_sort_mp4_files = timer.wrap("folder_scan", originals["find_and_sort_mp4_files"])
+        gemini_tools.upload_to_gemini = timer.wrap("upload", originals["upload_to_gemini"])
+        # Responses are parsed by one of: the streaming parser, JSON output mode decoding or the text-mode fallback
+        gemini_tools.parse_tool_json = timer.wrap("json_extraction", originals["parse_tool_json"])
+        gemini_tools.decode_tool_response = timer.wrap("json_extraction", originals["decode_tool_response"])
+        gemini_tools.consume_stream = _timed_consume_stream(originals["consume_stream"], timer)
+        gemini_tools.update_databank = timer.wrap("update_databank", originals["update_databank"])
+        gemini_tools.save_gemini_output = timer.wrap("save_gemini_output", originals["save_gemini_output"])
+        backend.start_chat = lambda model, history: _TimedChatSession(original_start_chat(model, history), timer)
+
+        start = time.perf_counter()
+        video_files = gemini_tools.find_and_sort_mp4_files(video_folder)
+        gemini_tools.run_clip_pipeline(video_files, gemini_tools.analyze_video, gemini_tools.commit_video, max_workers=max_workers)
+        gemini_tools.RESULT_SINK.close()
+        gemini_tools.export_databank()
+        timer.wrap("extract_summary", extract_summary.main)()
+        wall_clock = time.perf_counter() - start
+    finally:
+        for name, func in originals.items():
+            setattr(gemini_tools, name, func)
+        backend.start_chat = original_start_chat
+
+    timer.samples["time_to_active"] = list(gemini_tools.FILE_POLLER.time_to_active.values())
+    return {"clips": clip_count, "wall_clock_s": wall_clock, "stages": timer.summary()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark of the clip pipeline against the fake backend.")
+    parser.add_argument("--clips", type=int, nargs="+", default=DEFAULT_CLIP_COUNTS, help="Clip counts to benchmark.")
+    parser.add_argument("--workers", type=int, default=gemini_tools.MAX_WORKERS, help="Clips kept in flight.")
+    parser.add_argument("--output", default="bench_results.json", help="Machine-readable results file.")
+    parser.add_argument("--work-dir", default=None, help="Scratch folder for synthetic clips and outputs.")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with open(gemini_tools.__file__, 'rb') as f:
+        source_hash = hashlib.sha256(f.read()).hexdigest()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="aria_bench_")
+    results = {
+        "gemini_tools_sha256": source_hash,
+        "python": sys.version.split()[0],
+        "workers": args.workers,
+        "fake_latency_s": gemini_tools.BACKEND.latency,
+        "runs": [],
+    }
+    for clip_count in args.clips:
+        run = run_benchmark(clip_count, work_dir, args.workers)
+        results["runs"].append(run)
+        print(f"{clip_count} clips: {run['wall_clock_s']:.2f}s")
+        for stage, stats in run["stages"].items():
+            print(f"  {stage:<20} p50 {stats['p50_s'] * 1000:9.2f} ms  p95 {stats['p95_s'] * 1000:9.2f} ms  p99 {stats['p99_s'] * 1000:9.2f} ms")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
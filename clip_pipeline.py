@@ -0,0 +1,49 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of clips kept in flight (upload, processing, generation, parsing) at once
+MAX_WORKERS = 4
+
+def run_clip_pipeline(video_files, analyze, commit, max_workers=MAX_WORKERS):
+    """
+    Runs analyze(video_path) for up to max_workers clips concurrently and calls
+    commit(video_path, result) in the original clip order, so that everything
+    written to the output CSV and the databank stays deterministic.
+    Returns the number of clips that were committed.
+    """
+    video_files = list(video_files)
+    logging.info(f"Starting clip pipeline for {len(video_files)} clips with {max_workers} workers")
+    committed = 0
+    clips = iter(video_files)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clip") as executor:
+        pending = deque()
+
+        def submit_next():
+            video_path = next(clips, None)
+            if video_path is not None:
+                pending.append((video_path, executor.submit(analyze, video_path)))
+
+        # Keep a small read-ahead window so workers never idle while the head clip commits
+        for _ in range(max_workers * 2):
+            submit_next()
+
+        while pending:
+            video_path, future = pending.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Error occurred in analyzing {video_path}: {str(e)}")
+                submit_next()
+                continue
+
+            try:
+                commit(video_path, result)
+                committed += 1
+            except Exception as e:
+                logging.error(f"Error occurred in committing {video_path}: {str(e)}")
+            submit_next()
+
+    logging.info(f"Clip pipeline finished: {committed}/{len(video_files)} clips committed")
+    return committed
@@ -0,0 +1,91 @@
+import logging
+import threading
+from task_index import TaskIndex, task_terms
+
+# Rough characters per token for budgeting prompt text (no tokenizer is available offline)
+CHARS_PER_TOKEN = 4
+# Default token budget for memory-bank context in a prompt
+MEMORY_CONTEXT_TOKENS = 4000
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+_MIN_LINE_TOKENS = estimate_tokens("- [] x using y")
+
+def format_row(row):
+    """Formats a memory-bank row (timestamp, action, tool, ...) as a prompt line."""
+    return f"- [{row[0]}] {row[1]} using {row[2]}"
+
+class ContextBuilder:
+    """
+    Builds the memory-bank part of a prompt from (task name, row) pairs (see
+    MemoryBank.task_rows): rows are ranked by BM25 relevance of their task name
+    and their action, tool and location to a query (rows that do not match
+    follow, newest first), rows with the same action and tool are kept once, and
+    lines are added until token_budget is reached. Rows are indexed
+    incrementally as the (append-only) list grows, and built contexts are
+    cached per query until it changes.
+    """
+    def __init__(self, token_budget=MEMORY_CONTEXT_TOKENS):
+        self.token_budget = token_budget
+        self.hits = 0
+        self.misses = 0
+        self._rows = None
+        self._indexed = 0
+        self._index = TaskIndex()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _sync(self, rows):
+        """Indexes (task name, row) pairs appended since the last call; starts over if given a different list."""
+        if rows is not self._rows or len(rows) < self._indexed:
+            self._rows, self._indexed, self._index = rows, 0, TaskIndex()
+            self._cache.clear()
+        if len(rows) == self._indexed:
+            return
+        for position in range(self._indexed, len(rows)):
+            task_name, row = rows[position]
+            if len(row) > 2:
+                self._index.add(position, task_terms(task_name, [row]))
+        self._indexed = len(rows)
+        self._cache.clear()
+
+    def _ranked(self, rows, query):
+        """Yields row positions: matches by score, then the other rows newest first."""
+        matches = [position for position, _ in self._index.search(query, k=len(self._index))]
+        yield from matches
+        matched = set(matches)
+        for position in range(len(rows) - 1, -1, -1):
+            if position not in matched and len(rows[position][1]) > 2:
+                yield position
+
+    def build(self, rows, query, header):
+        """Returns header plus the best of the (task name, row) pairs for query within the token budget, or "" if there are none."""
+        key = (query, header, self.token_budget)
+        with self._lock:
+            self._sync(rows)
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+            budget = self.token_budget - estimate_tokens(header)
+            lines = []
+            seen = set()
+            for position in self._ranked(rows, query):
+                row = rows[position][1]
+                identity = (row[1].strip().lower(), row[2].strip().lower())
+                if identity in seen:
+                    continue
+                line = format_row(row)
+                cost = estimate_tokens(line)
+                if cost > budget:
+                    continue
+                seen.add(identity)
+                lines.append(line)
+                budget -= cost
+                if budget < _MIN_LINE_TOKENS:
+                    break
+            context = header + "\n".join(lines) + "\n" if lines else ""
+            self._cache[key] = context
+            logging.info(f"Memory context for '{query}': {len(lines)} of {len(rows)} rows, ~{estimate_tokens(context)} tokens")
+            return context
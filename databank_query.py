@@ -0,0 +1,113 @@
+import os
+import json
+import bisect
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+def _positions(frame, column):
+    """Hash index {normalized value: row positions} for a column."""
+    if column not in frame.columns or frame.empty:
+        return {}
+    keys = frame[column].astype(str).str.strip().str.lower()
+    return frame.groupby(keys.values, sort=False).indices
+
+class DatabankIndex:
+    """
+    In-memory view of a databank file (the CSV databank or a tool_databank
+    JSON/CSV export) with hash indexes on object name and type.
+    The file is only re-read when its mtime or size changes; hits counts
+    queries served from memory and misses counts (re)loads.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.frame = None
+        self._signature = None
+        self._by_name = {}
+        self._by_type = {}
+        self._names = []
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            head = f.read(64).lstrip()
+            f.seek(0)
+            # tool_databank.csv written by gemini_tools holds JSON despite its name
+            if head.startswith(('{', '[')):
+                data = json.load(f)
+                return pd.DataFrame(data.get("tools", []) if isinstance(data, dict) else data)
+            return pd.read_csv(f)
+
+    def _refresh(self):
+        """Reloads the file if it changed; returns the current frame (None if there is no file)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.frame, self._signature = None, None
+            self._by_name, self._by_type, self._names = {}, {}, []
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            self.hits += 1
+            return self.frame
+        self.misses += 1
+        frame = self._load()
+        name_column = "object_name" if "object_name" in frame.columns else "object"
+        by_name = _positions(frame, name_column)
+        by_type = _positions(frame, "object_type")
+        self.frame, self._signature = frame, signature
+        self._by_name, self._by_type = by_name, by_type
+        self._names = sorted(by_name)
+        logging.info(f"Databank index loaded {len(frame)} rows from {self.path}")
+        return frame
+
+    def _rows(self, positions):
+        return self.frame.iloc[positions] if positions is not None and len(positions) else None
+
+    def query(self, object_name):
+        """Returns the rows for an object name (case-insensitive), or None."""
+        with self._lock:
+            if self._refresh() is None:
+                return None
+            return self._rows(self._by_name.get(_normalize(object_name)))
+
+    def query_many(self, object_names):
+        """Returns {name: rows or None} for many object names with a single freshness check."""
+        with self._lock:
+            if self._refresh() is None:
+                return {name: None for name in object_names}
+            return {name: self._rows(self._by_name.get(_normalize(name))) for name in object_names}
+
+    def query_type(self, object_type):
+        """Returns the rows for an object type (case-insensitive), or None."""
+        with self._lock:
+            if self._refresh() is None:
+                return None
+            return self._rows(self._by_type.get(_normalize(object_type)))
+
+    def search(self, text, prefix=False):
+        """Returns the rows whose object name starts with (prefix=True) or contains text, or None."""
+        text = _normalize(text)
+        with self._lock:
+            if self._refresh() is None:
+                return None
+            if prefix:
+                start = bisect.bisect_left(self._names, text)
+                end = bisect.bisect_left(self._names, text + "\uffff")
+                names = self._names[start:end]
+            else:
+                names = [name for name in self._names if text in name]
+            if not names:
+                return None
+            return self._rows(np.sort(np.concatenate([self._by_name[name] for name in names])))
+
+    def stats(self):
+        """Returns cache hit/miss counters and index sizes."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "names": len(self._by_name), "types": len(self._by_type)}
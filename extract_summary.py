@@ -1,75 +1,104 @@
 import os
-import pandas as pd
+import io
 import csv
+import json
+import hashlib
 import gemini_tools
+from result_sink import ResultReader
 
 # 定义文件路径
 #RESULT_BASE_PATH = "/mnt/Data/bosong/agent/result_gemini-2.0-flash-exp"
 
+# Results written by gemini_tools (result sink); INPUT_CSV_FILE holds older results and those of the legacy scripts
+INPUT_RESULTS_FOLDER = gemini_tools.RESULT_SINK.folder
 INPUT_CSV_FILE = os.path.join(gemini_tools.RESULT_BASE_PATH, "gemini_output.csv")
 OUTPUT_CSV_FILE = os.path.join(gemini_tools.RESULT_BASE_PATH, "task_summaries_output.csv")
-INPUT_TXT_FILE = os.path.join(gemini_tools.RESULT_BASE_PATH, "gemini_output.txt")
+# Byte offset up to which each source file has been summarized (delete it to rebuild the output)
+CHECKPOINT_FILE = os.path.join(gemini_tools.RESULT_BASE_PATH, "task_summaries_checkpoint.json")
 
-def convert_to_txt(csv_file, txt_file):
-    """将 CSV 文件转换为 TXT 文件。"""
-    try:
-        df = pd.read_csv(csv_file, header=None, encoding='utf-8-sig', quotechar='"', skipinitialspace=True, on_bad_lines='skip')
-        print("CSV file read successfully.")
-        
-        # 写入 TXT 文件
-        df.to_csv(txt_file, index=False, header=False, encoding='utf-8-sig', sep='\t', lineterminator='\n')
-        print(f"CSV file converted to TXT: {txt_file}")
-    except Exception as e:
-        print(f"An error occurred while converting the CSV file to TXT: {str(e)}")  
+_SPECIAL_CHARS = str.maketrans("", "", "`‘’{}[]\"")
 
 def clean_line(line):
     """清理行中的特殊字符。"""
-    special_chars = ["`", "‘", "’", "{", "}", "[", "]", '"']
-    for char in special_chars:
-        line = line.replace(char, "")
-    return line.strip()
+    return line.translate(_SPECIAL_CHARS).strip()
 
-def extract_task_summaries(txt_file):
-    """从 TXT 文件中提取任务总结并按顺序返回。"""
-    if not os.path.exists(txt_file):
-        print("TXT file does not exist")
-        return []
+def read_new_responses(source, offset):
+    """
+    Returns (response texts, offset) for the responses appended to source (the
+    result sink index or a gemini_output.csv) after byte offset, and the offset
+    to resume from next time.
+    """
+    if source.endswith(".index.jsonl"):
+        records, offset = ResultReader(INPUT_RESULTS_FOLDER).read_from(offset)
+        return [record["response_text"] for record in records], offset
+    with open(source, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    text = data[:end].decode('utf-8-sig' if offset == 0 else 'utf-8')
+    responses = [row[1] for row in csv.reader(io.StringIO(text, newline='')) if len(row) > 1 and row[1] != "response_text"]
+    return responses, offset + end
 
+def extract_task_summaries(response_text):
+    """从一条模型输出中提取任务总结并按顺序返回（未以 'End Summary.' 结束的总结被丢弃）。"""
     summaries = []
-    try:
-        with open(txt_file, 'r', encoding='utf-8') as file:
-            print("TXT file read successfully.")
+    current_summary = []
+    recording = False
+    for line in response_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        line = clean_line(line)
+
+        if "Task Summary:" in line:
+            recording = True
+            current_summary.append(line)
+        elif "End Summary." in line and recording:
+            current_summary.append(line)
+            summaries.append("\n".join(current_summary))
             current_summary = []
             recording = False
-            
-            for line in file:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                line = clean_line(line)
-
-                if "Task Summary:" in line:
-                    recording = True
-                    current_summary.append(line)
-                elif "End Summary." in line and recording:
-                    current_summary.append(line)
-                    summaries.append("\n".join(current_summary))
-                    current_summary = []
-                    recording = False
-                elif recording:
-                    current_summary.append(line)
-                
-        return summaries
-    except Exception as e:
-        print(f"An error occurred while reading the TXT file: {str(e)}")
-        return []
+        elif recording:
+            current_summary.append(line)
+    return summaries
 
-def save_task_summaries(summaries, output_csv_file):
-    """将提取的任务总结保存到新的 CSV 文件。"""
+def load_checkpoint():
+    """Returns {source file: byte offset already summarized}, or None if there is no checkpoint yet."""
+    if not os.path.exists(CHECKPOINT_FILE):
+        return None
+    with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if "source" in checkpoint:
+        # Checkpoint of a single source
+        return {checkpoint["source"]: checkpoint["offset"]}
+    return checkpoint["offsets"]
+
+def save_checkpoint(offsets):
+    tmp_path = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"offsets": offsets}, f)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+def _response_key(response_text):
+    return hashlib.sha256(response_text.encode('utf-8')).hexdigest()
+
+def _read_source(source, offsets):
+    """Reads the new responses of one source and advances its offset."""
+    offset = offsets.get(source, 0)
+    if offset > os.path.getsize(source):
+        # Truncated or recreated; its contents are new, the summaries already written are kept
+        print(f"{source} is smaller than its checkpoint, reading it from the start")
+        offset = 0
+    responses, offsets[source] = read_new_responses(source, offset)
+    print(f"Read {len(responses)} new responses from {source}")
+    return responses
+
+def save_task_summaries(summaries, output_csv_file, append=False):
+    """将提取的任务总结保存到 CSV 文件（append=True 时追加）。"""
     try:
         if summaries:
-            with open(output_csv_file, mode='w', encoding='utf-8-sig', newline='') as file:
+            with open(output_csv_file, mode='a' if append else 'w', encoding='utf-8-sig', newline='') as file:
                 writer = csv.writer(file)  # 创建 CSV 写入对象
                 for summary in summaries:
                     writer.writerow([summary])  # 将每个总结作为一行写入 CSV 文件
@@ -80,13 +109,38 @@ def save_task_summaries(summaries, output_csv_file):
         print(f"An error occurred while saving the task summaries: {str(e)}")
 
 def main():
-    convert_to_txt(INPUT_CSV_FILE, INPUT_TXT_FILE)
-    task_summaries = extract_task_summaries(INPUT_TXT_FILE)
+    """
+    Summarizes only the responses appended since the last run and appends them to OUTPUT_CSV_FILE.
+    Folders with results from before the result sink are read from INPUT_CSV_FILE until the sink
+    appears; the sink then takes over, skipping the responses the CSV (which mirrors them) already had.
+    """
+    sink_index = ResultReader(INPUT_RESULTS_FOLDER).index_path
+    checkpoint = load_checkpoint()
+    offsets = dict(checkpoint or {})
+    have_sink = os.path.exists(sink_index)
+    if not have_sink and not os.path.exists(INPUT_CSV_FILE):
+        print("No results to summarize.")
+        return
+
+    responses = []
+    if sink_index not in offsets and os.path.exists(INPUT_CSV_FILE):
+        responses += _read_source(INPUT_CSV_FILE, offsets)
+    if have_sink:
+        switching = sink_index not in offsets
+        sink_responses = _read_source(sink_index, offsets)
+        if switching and os.path.exists(INPUT_CSV_FILE):
+            summarized = {_response_key(text) for text in read_new_responses(INPUT_CSV_FILE, 0)[0]}
+            sink_responses = [text for text in sink_responses if _response_key(text) not in summarized]
+            print(f"Switched to the result sink, {len(sink_responses)} responses not in {INPUT_CSV_FILE}")
+        responses += sink_responses
+    task_summaries = [summary for response_text in responses for summary in extract_task_summaries(response_text)]
 
     if task_summaries:
-        save_task_summaries(task_summaries, OUTPUT_CSV_FILE)
+        # Without a checkpoint every source was read from the start, so the output is rebuilt
+        save_task_summaries(task_summaries, OUTPUT_CSV_FILE, append=checkpoint is not None)
     else:
         print("No task summaries to save.")
+    save_checkpoint(offsets)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
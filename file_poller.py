@@ -0,0 +1,129 @@
+import time
+import random
+import logging
+import threading
+from request_scheduler import is_retryable
+
+# Default seconds FilePoller.wait blocks before giving up on a file
+FILE_WAIT_TIMEOUT = 600.0
+# Consecutive retryable get_file errors after which a file is failed
+MAX_POLL_FAILURES = 5
+
+class _PendingFile:
+    def __init__(self, name, display_name, initial_delay):
+        self.name = name
+        self.display_name = display_name
+        self.started = time.monotonic()
+        self.next_poll = self.started
+        self.delay = initial_delay
+        self.done = threading.Event()
+        self.state = "PROCESSING"
+        self.file = None
+        self.error = None
+        self.failures = 0
+        self.waiters = 0
+
+class FilePoller:
+    """
+    Shared poller for uploaded files that are still PROCESSING.
+    One background thread polls every pending file on its own exponential
+    backoff schedule (with jitter, starting sub-second) and wakes each waiter
+    as soon as its file leaves the PROCESSING state. A file fails on a
+    non-retryable get_file error or after max_failures retryable ones in a row.
+    """
+    def __init__(self, get_file, initial_delay=0.5, max_delay=10.0, backoff=1.6, jitter=0.2, max_failures=MAX_POLL_FAILURES):
+        self.get_file = get_file
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self.max_failures = max_failures
+        self.time_to_active = {}  # display name (clip) -> seconds until ACTIVE
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def wait(self, file, timeout=FILE_WAIT_TIMEOUT):
+        """
+        Blocks until the given file is ACTIVE and returns the refreshed file object.
+        Raises TimeoutError after timeout seconds (None waits forever); the file is
+        then no longer polled unless another caller is still waiting for it.
+        """
+        with self._cond:
+            entry = self._pending.get(file.name)
+            if entry is None:
+                entry = _PendingFile(file.name, getattr(file, "display_name", None) or file.name, self.initial_delay)
+                self._pending[file.name] = entry
+            entry.waiters += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="file-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+        ready = entry.done.wait(timeout)
+        with self._cond:
+            entry.waiters -= 1
+            if not ready and entry.waiters == 0 and self._pending.get(file.name) is entry:
+                del self._pending[file.name]
+        if not ready:
+            raise TimeoutError(f"File {file.name} was not ready after {timeout}s")
+        if entry.state != "ACTIVE":
+            reason = f": {entry.error}" if entry.error is not None else f" (state {entry.state})"
+            logging.error(f"File {file.name} failed to process{reason}")
+            raise Exception(f"File {file.name} failed to process{reason}")
+        return entry.file
+
+    def pending_count(self):
+        """Returns the number of files that are still being polled."""
+        with self._cond:
+            return len(self._pending)
+
+    def metrics(self):
+        """Returns count, mean and max time-to-active over all files seen so far."""
+        values = list(self.time_to_active.values())
+        if not values:
+            return {"files": 0, "mean_s": 0.0, "max_s": 0.0}
+        return {"files": len(values), "mean_s": sum(values) / len(values), "max_s": max(values)}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [e for e in self._pending.values() if e.next_poll <= now]
+                    if due:
+                        break
+                    if self._pending:
+                        self._cond.wait(min(e.next_poll for e in self._pending.values()) - now)
+                    else:
+                        self._cond.wait()
+
+            for entry in due:
+                self._poll(entry)
+
+    def _poll(self, entry):
+        try:
+            file = self.get_file(entry.name)
+            state = file.state.name
+            entry.failures = 0
+        except Exception as e:
+            entry.failures += 1
+            logging.warning(f"Polling file {entry.name} failed ({entry.failures}/{self.max_failures}): {str(e)}")
+            if is_retryable(e) and entry.failures < self.max_failures:
+                file, state = None, "PROCESSING"
+            else:
+                file, state, entry.error = None, "FAILED", e
+
+        if state == "PROCESSING":
+            entry.next_poll = time.monotonic() + entry.delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            entry.delay = min(entry.delay * self.backoff, self.max_delay)
+            return
+
+        elapsed = time.monotonic() - entry.started
+        entry.file, entry.state = file, state
+        if state == "ACTIVE":
+            self.time_to_active[entry.display_name] = elapsed
+            logging.info(f"File {entry.name} ({entry.display_name}) active after {elapsed:.2f}s")
+        with self._cond:
+            self._pending.pop(entry.name, None)
+        entry.done.set()
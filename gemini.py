@@ -6,8 +6,16 @@ from config import GEMINI_API_KEY
 import pandas as pd
 import re
 import csv
-import sys
 import json
+import argparse
+from backends import run_path
+from response_cache import ResponseCache, make_cache_key, RESPONSE_CACHE_FILE
+from usage_tracker import USAGE_TRACKER, gemini_usage
+from request_scheduler import SCHEDULER
+from json_extract import extract_json_object
+from tool_databank import upsert_tool_frame, FRAME_COLUMNS
+from databank_query import DatabankIndex
+from clip_pipeline import run_clip_pipeline, MAX_WORKERS
 
 # Configure logging
 logging.basicConfig(
@@ -22,43 +30,24 @@ logging.basicConfig(
 # Configure Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
 
+# Backend, file poller and upload manifest shared by the Gemini scripts (imported once logging is set up)
+from gemini_files import BACKEND, UPLOAD_CACHE, upload_to_gemini, wait_for_files_active
+
+# Disk-backed cache of model responses keyed on clip, prompt and model config
+RESPONSE_CACHE = ResponseCache(run_path(RESPONSE_CACHE_FILE))
+
 # Define the base path for results
-RESULT_BASE_PATH = "/mnt/Data/bosong/agent/result_gemini-2.0-flash-exp"
+RESULT_BASE_PATH = run_path("/mnt/Data/bosong/agent/result_gemini-2.0-flash-exp")
 #RESULT_BASE_PATH = "/mnt/Data/bosong/agent/result_gemini-2.0-flash-thinking-exp-1219"
 
 # Define the path to your Excel file
 DATABANK_FILE = os.path.join(RESULT_BASE_PATH, "tool_databank.csv")
+# Cached, indexed view of DATABANK_FILE for queries (reloaded only when the file changes)
+DATABANK_INDEX = DatabankIndex(DATABANK_FILE)
 
 # Define the path to your CSV file
 CSV_FILE = os.path.join(RESULT_BASE_PATH, "gemini_output.csv")
 
-def upload_to_gemini(path, mime_type=None):
-    """Uploads the given file to Gemini."""
-    try:
-        file = genai.upload_file(path, mime_type=mime_type)
-        logging.info(f"Uploaded file '{file.display_name}' as: {file.uri}")
-        return file
-    except Exception as e:
-        logging.error(f"Failed to upload file {path}: {str(e)}")
-        return None
-
-def wait_for_files_active(files):
-    """Waits for the given files to be active."""
-    logging.info("Waiting for file processing...")
-    for name in (file.name for file in files):
-        file = genai.get_file(name)
-        while file.state.name == "PROCESSING":
-            # 使用 sys.stdout.write() 来输出点而不换行
-            sys.stdout.write(".")
-            sys.stdout.flush()  # 立即刷新输出
-            time.sleep(10)
-            file = genai.get_file(name)
-        if file.state.name != "ACTIVE":
-            logging.error(f"File {file.name} failed to process")
-            raise Exception(f"File {file.name} failed to process")
-    logging.info("...all files ready")
-    logging.info(f"File {file.name}")  # 为了更好的可读性添加换行
-
 # Create the model
 generation_config = {
     "temperature": 0.2,
@@ -68,11 +57,10 @@ generation_config = {
     "response_mime_type": "text/plain",
 }
 
-model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash-exp",
-    #model_name="gemini-2.0-flash-thinking-exp-1219",
-    generation_config=generation_config,
-    system_instruction="""You are an AI assistant, helping the worker. Analyze the video and identify all instances where the user is holding a tool (e.g., screwdrivers, pliers, wrenches) or an object (e.g., boxes, packaging materials). For each instance, provide:
+# Rough tokens per clip request (90 s of video at ~263 tokens/s plus the response) for quota planning
+VIDEO_TOKEN_ESTIMATE = 90 * 263 + generation_config["max_output_tokens"]
+
+SYSTEM_INSTRUCTION = """You are an AI assistant, helping the worker. Analyze the video and identify all instances where the user is holding a tool (e.g., screwdrivers, pliers, wrenches) or an object (e.g., boxes, packaging materials). For each instance, provide:
 - Precise timestamps for when the tool or object is held.
 - Detailed descriptions of each action or movement involving the tool or object, including how the user is using it. For example, "using a screwdriver to fasten a bolt."
 - Detailed descriptions of the shape (e.g., round, square, rectangular, irregular) and size (e.g., length, width, height, diameter) of each tool or object.
@@ -103,6 +91,12 @@ Ensure that repeat frame is minimized, but the description of objects and action
 
 Additionally, extract the table data into a CSV file for subsequent reading and writing. Identify all tools and objects held by the user in the video, and ensure the analysis is thorough and accurate.
 """
+
+model = genai.GenerativeModel(
+    model_name="gemini-2.0-flash-exp",
+    #model_name="gemini-2.0-flash-thinking-exp-1219",
+    generation_config=generation_config,
+    system_instruction=SYSTEM_INSTRUCTION,
 )
 
 def extract_tool_info(response_text):
@@ -135,44 +129,16 @@ def update_databank(new_tool_info):
             df = pd.read_csv(DATABANK_FILE)
         else:
             # 如果文件不存在或为空，则创建一个新的 DataFrame
-            df = pd.DataFrame(columns=['timestamp', 'object', 'object_type', 'object_color', 'object_size', 'action', 'status', 'location'])
+            df = pd.DataFrame(columns=FRAME_COLUMNS)
             logging.warning("Databank file not found or is empty. Creating a new dataframe.")
         
     except Exception as e:
         logging.error(f"Error reading databank file: {str(e)}")
         return
     if new_tool_info:
-        # 处理 JSON 输出
-        for tool_info in new_tool_info:
-            object_name = tool_info['object_name']
-            action = tool_info['action']
-            timestamp = tool_info['timestamp']
-            object_type = tool_info.get('object_type', 'Unknown')
-            object_color = tool_info.get('object_color', 'Unknown')
-            object_size = tool_info.get('object_size', 'Unknown')
-
-            # 检查工具是否已存在
-            existing_tool = df[(df['object'] == object_name)]
-            if not existing_tool.empty:
-                # 更新现有工具信息
-                df.loc[existing_tool.index, 'timestamp'] = timestamp
-                df.loc[existing_tool.index, 'action'] = action
-                df.loc[existing_tool.index, 'status'] = "Normal"
-                logging.info(f"Updated information for tool: {object_name}")
-            else:
-                # 添加新工具信息
-                new_row = {
-                    'timestamp': timestamp,
-                    'object': object_name,
-                    'object_type': object_type,
-                    'object_color': object_color,
-                    'object_size': object_size,
-                    'action': action,
-                    'status': "Normal",
-                    'location': "Unknown"
-                }
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                logging.info(f"Added new tool: {object_name}")
+        # 一次性合并所有工具信息
+        df, inserted, updated = upsert_tool_frame(df, new_tool_info)
+        logging.info(f"Added {inserted} new tools, updated {updated} databank rows")
 
     df.to_csv(DATABANK_FILE, index=False)
     logging.info("Databank updated successfully.")
@@ -181,17 +147,19 @@ def query_databank(tool_name):
     """Queries the databank for information about a specific tool."""
     logging.info(f"Querying databank for tool: {tool_name}...")
     try:
-        df = pd.read_csv(DATABANK_FILE)
-        if df.empty:
-            logging.warning("Databank is empty. No tools to query")
-            return None
-    except FileNotFoundError:
+        tool_info = DATABANK_INDEX.query(tool_name)
+    except Exception as e:
+        logging.error(f"Error reading databank file: {str(e)}")
+        return None
+    if DATABANK_INDEX.frame is None:
         logging.error("Databank file not found.")
         return None
+    if DATABANK_INDEX.frame.empty:
+        logging.warning("Databank is empty. No tools to query")
+        return None
 
     # 查找工具信息
-    tool_info = df[df['object'] == tool_name]
-    if tool_info.empty:
+    if tool_info is None:
         logging.warning(f"Tool '{tool_name}' not found in the databank.")
         return None
     else:
@@ -199,6 +167,15 @@ def query_databank(tool_name):
         logging.info(tool_info)
         return tool_info
 
+def query_databank_many(tool_names):
+    """Queries the databank for several tools at once; returns {tool_name: rows or None}."""
+    logging.info(f"Querying databank for {len(tool_names)} tools...")
+    try:
+        return DATABANK_INDEX.query_many(tool_names)
+    except Exception as e:
+        logging.error(f"Error reading databank file: {str(e)}")
+        return {tool_name: None for tool_name in tool_names}
+
 def save_gemini_output(response_text):
     """Saves Gemini's output to a CSV file."""
     logging.info("Saving Gemini's output...")
@@ -249,8 +226,27 @@ def find_and_sort_mp4_files(folder_path):
 #            logging.error(f"Error from Gemini API: {str(e)}")
 #            return None
 
+VIDEO_ANALYSIS_PROMPT = """You are an AI assistant, helping the worker. Analyze the video and identify all instances where the user is holding a tool (e.g., screwdrivers, pliers, wrenches) or an object (e.g., boxes, packaging materials). 
+Ensure that the output is valid JSON and does not contain any additional textual explanations or interpretations, video_name should be the input video name
+
+Ensure that repeat frame is minimized, but the description of objects and actions needs to be accurate and complete.:
+- If the action does not change for more than 6 seconds, only include the timestamps for the start, middle, and end of that action.
+- Provide a summary after the table that explains the behavior of the user with respect to the tools and objects.
+
+Additionally, extract the table data into a JSON/CSV file for subsequent reading and writing. Identify all tools and objects held by the user in the video, and ensure the analysis is thorough and accurate.
+                    """
+
+VIDEO_ANALYSIS_MESSAGE = "Extract tool and action information from the videos. Analyze the video and identify all instances, extract the table data into a JSON/CSV file for subsequent reading and writing."
+
 # Main function
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract tool usage from video clips with Gemini.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the response cache.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached responses and overwrite them.")
+    args = parser.parse_args(argv)
+    RESPONSE_CACHE.enabled = not args.no_cache
+    RESPONSE_CACHE.refresh = args.refresh
+
     logging.info("Starting main function...")
     video_folder = "/mnt/logicNAS/Exchange/Aria/User_16/video_seg_90/"  
 
@@ -260,16 +256,32 @@ def main():
     all_tool_info=[]
 #    gemini_agent = GeminiAgent(model)
 
-    for video_path in video_files:
+    def analyze_video(video_path):
+        """Asks Gemini for the tools in a video, or reuses a cached answer (runs in a pipeline worker)."""
         logging.info(f"Processing video file: {video_path}")
+        cache_key = make_cache_key(
+            UPLOAD_CACHE.content_hash(video_path),
+            # The system instruction is part of the request too, so a changed one must not hit old responses
+            [SYSTEM_INSTRUCTION, VIDEO_ANALYSIS_PROMPT, VIDEO_ANALYSIS_MESSAGE],
+            model.model_name,
+            generation_config,
+            BACKEND.name,
+        )
+        return RESPONSE_CACHE.get_or_call(cache_key, lambda: generate_video_response(video_path))
+
+    def generate_video_response(video_path):
+        """Uploads a video and asks Gemini for its tools."""
         # Upload the video file
         files = [upload_to_gemini(video_path, mime_type="video/mp4")]
+        if files[0] is None:
+            raise RuntimeError(f"Upload of {video_path} failed")
 
         # Wait for the file to be ready
         wait_for_files_active(files)
         # Start a chat session
         logging.info("Starting chat session...")
-        chat_session = model.start_chat(
+        chat_session = BACKEND.start_chat(
+            model,
             history=[
                 {
                     "role": "user",
@@ -280,27 +292,24 @@ def main():
                 {
                     "role": "user",
                     "parts": [
-                        """You are an AI assistant, helping the worker. Analyze the video and identify all instances where the user is holding a tool (e.g., screwdrivers, pliers, wrenches) or an object (e.g., boxes, packaging materials). 
-Ensure that the output is valid JSON and does not contain any additional textual explanations or interpretations, video_name should be the input video name
-
-Ensure that repeat frame is minimized, but the description of objects and actions needs to be accurate and complete.:
-- If the action does not change for more than 6 seconds, only include the timestamps for the start, middle, and end of that action.
-- Provide a summary after the table that explains the behavior of the user with respect to the tools and objects.
-
-Additionally, extract the table data into a JSON/CSV file for subsequent reading and writing. Identify all tools and objects held by the user in the video, and ensure the analysis is thorough and accurate.
-                    """],
+                        VIDEO_ANALYSIS_PROMPT],
                 },
             ]
         )
 
         # Send the message to Gemini
         logging.info("Sending message to Gemini...")
-        response_text = chat_session.send_message("Extract tool and action information from the videos. Analyze the video and identify all instances, extract the table data into a JSON/CSV file for subsequent reading and writing.")
+        with USAGE_TRACKER.track("generation", model.model_name, video_path) as call:
+            response = SCHEDULER.call(model.model_name, lambda: chat_session.send_message(VIDEO_ANALYSIS_MESSAGE), tokens=VIDEO_TOKEN_ESTIMATE, usage=call)
+            call.input_tokens, call.output_tokens = gemini_usage(response)
+        return response.text
 
+    def commit_video(video_path, response_text):
+        """Saves and parses a response in clip order."""
         #check if response is empty before parsing
         if not response_text:
             logging.warning("Received empty response from Gemini.")
-            continue #skip to next video
+            return #skip to next video
 
         # Save Gemini's output
         save_gemini_output(response_text)
@@ -348,13 +357,10 @@ Additionally, extract the table data into a JSON/CSV file for subsequent reading
             if not isinstance(response_text, str):
                 raise ValueError(f"Expected string input, but got {type(response_text)}.")
     
-            # 使用正则表达式查找 JSON 对象
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-    
-            if json_match:
-                json_str = json_match.group(0)
-                tool_info_json = json.loads(json_str)
+            # 查找 JSON 对象
+            tool_info_json = extract_json_object(response_text, required_key="tools")
     
+            if tool_info_json:
                 if 'tools' in tool_info_json:
                     video_name = tool_info_json.get("video_name", "Unknown Video")
                     tools = tool_info_json['tools']
@@ -406,7 +412,7 @@ Additionally, extract the table data into a JSON/CSV file for subsequent reading
             logging.error(f"Failed to decode JSON from response: {str(e)}")
         except Exception as e:
             logging.error(f"An unexpected error occurred while processing video {video}: {str(e)}")
-            continue  # Skip to the next video
+            return  # Skip to the next video
 #       try:
 #           #tool_info_json = json.loads(response.text)
 #           #all_tool_info.extend(tool_info_json)
@@ -443,6 +449,8 @@ Additionally, extract the table data into a JSON/CSV file for subsequent reading
         #    logging.warning("No tool information extracted from the response.")
         #    update_databank(pd.DataFrame(columns=['timestamp', 'object', 'action']))  # Update with empty df
 
+    run_clip_pipeline(video_files, analyze_video, commit_video, max_workers=MAX_WORKERS)
+
     # Example: Query the databank for a specific tool
     #tool_to_query = "#3 red screwdriver"
     #query_result = query_databank(tool_to_query)
@@ -460,6 +468,8 @@ Additionally, extract the table data into a JSON/CSV file for subsequent reading
         logging.warning("No tool information collected from any video.")
 
     # Estimate the total cost
+    logging.info(f"Request scheduler: {SCHEDULER.stats()}")
+    USAGE_TRACKER.write_report(os.path.join(RESULT_BASE_PATH, "usage_report.json"))
 #    estimated_cost = (gemini_agent.total_input_tokens * 0.0000025 + gemini_agent.total_output_tokens * 0.000008)  # Replace with actual prices
 #    logging.info(f"Estimated total input tokens: {gemini_agent.total_input_tokens}")
 #    logging.info(f"Estimated total output tokens: {gemini_agent.total_output_tokens}")
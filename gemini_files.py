@@ -0,0 +1,35 @@
+import logging
+from backends import get_backend, run_path
+from file_poller import FilePoller
+from upload_cache import UploadCache, UPLOAD_MANIFEST_FILE
+from request_scheduler import SCHEDULER
+
+# Model backend: the real Gemini API, or the local fake with ARIA_BACKEND=fake
+BACKEND = get_backend()
+
+# Shared poller that tracks every pending upload until it turns ACTIVE
+FILE_POLLER = FilePoller(BACKEND.get_file)
+
+# Manifest of previous uploads so re-runs reuse remote files instead of re-uploading
+UPLOAD_CACHE = UploadCache(run_path(UPLOAD_MANIFEST_FILE))
+
+def upload_to_gemini(path, mime_type=None):
+    """Uploads the given file to Gemini, reusing a previous upload of the same content."""
+    try:
+        file = UPLOAD_CACHE.reuse(path, lambda name: SCHEDULER.call("file-api", lambda: BACKEND.get_file(name)))
+        if file is not None:
+            return file
+        file = SCHEDULER.call("file-api", lambda: BACKEND.upload_file(path, mime_type=mime_type))
+        logging.info(f"Uploaded file '{file.display_name}' as: {file.uri}")
+        UPLOAD_CACHE.remember(path, file)
+        return file
+    except Exception as e:
+        logging.error(f"Failed to upload file {path}: {str(e)}")
+        return None
+
+def wait_for_files_active(files):
+    """Waits for the given files to be active."""
+    logging.info("Waiting for file processing...")
+    for file in files:
+        FILE_POLLER.wait(file)
+    logging.info("...all files ready")
@@ -8,7 +8,14 @@ import pandas as pd
 import re
 import sys
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from usage_tracker import USAGE_TRACKER, gemini_usage
+from request_scheduler import SCHEDULER, BATCH, INTERACTIVE
+from memory_bank import MemoryBank
+from backends import get_backend, run_path, cache_rejection
+from file_poller import FilePoller
+from upload_cache import UploadCache, UPLOAD_MANIFEST_FILE
+from context_builder import ContextBuilder, format_row
 
 # --- Configuration ---
 MEMORY_FOLDER = "/mnt/logicNAS/Exchange/bosong/memory/"
@@ -47,37 +54,43 @@ model = genai.GenerativeModel(
 """
 
 # --- Memory Bank Functions ---
+# Videos up to this size are sent inline; inline requests are capped at 20 MB and base64 adds a third,
+# so larger videos are uploaded with the File API, which streams them from disk
+INLINE_VIDEO_MAX_BYTES = 14 * 1024 * 1024
+
+# File API access (the real Gemini API, or the local fake with ARIA_BACKEND=fake), shared upload poller and upload manifest
+BACKEND = get_backend()
+FILE_POLLER = FilePoller(BACKEND.get_file)
+UPLOAD_CACHE = UploadCache(run_path(UPLOAD_MANIFEST_FILE))
+
+# Token budget for past-task context in video and question prompts (most relevant rows first)
+MEMORY_CONTEXT_TOKENS = 4000
+MEMORY_CONTEXT = ContextBuilder(MEMORY_CONTEXT_TOKENS)
+
+# How long the context of a Q&A session is kept as cached content
+QA_CACHE_TTL = timedelta(minutes=30)
+QA_INSTRUCTIONS = "Answer my questions based on the provided context of past tasks and the actions performed in the video I just processed. If a question is not related to the context, please indicate that you cannot answer it based on the given information."
+
+# Tasks considered when generating instructions (best BM25 match first)
+INSTRUCTION_TOP_K = 5
+
+# Parsed memory banks per folder; each load only re-reads new or changed CSV files
+MEMORY_BANKS = {}
+
+def get_memory_bank(memory_folder):
+    """Returns the cached MemoryBank for a folder."""
+    if memory_folder not in MEMORY_BANKS:
+        MEMORY_BANKS[memory_folder] = MemoryBank(memory_folder)
+    return MEMORY_BANKS[memory_folder]
+
 def read_memory_bank(memory_folder):
     """
-    Reads all CSV files from the memory folder and returns a list of task data.
-    Each task data is a list of rows from a CSV file.
+    Reads all CSV files from the memory folder and returns the task-wise data
+    ({task name: rows}) and the rows of all tasks combined as (task name, row)
+    pairs (both read-only).
     """
-    memory_data = {}
-    if not os.path.exists(memory_folder):
-        os.makedirs(memory_folder)  # Create folder if it doesn't exist
-        logging.info(f"Memory folder created: {memory_folder}")
-        return memory_data # Return empty dict if folder is newly created
-
-    all_task_data = [] # List to hold all task data for combined context
-    for filename in os.listdir(memory_folder):
-        if filename.endswith(".csv"):
-            task_name = filename[:-4]  # Remove ".csv" extension for task name
-            filepath = os.path.join(memory_folder, filename)
-            task_data = []
-            try:
-                with open(filepath, 'r', newline='') as csvfile:
-                    csv_reader = csv.reader(csvfile)
-                    header = next(csv_reader, None) # Read header row if exists
-                    if header:
-                        task_data.append(header) # Include header in task data
-                    for row in csv_reader:
-                        task_data.append(row)
-                        all_task_data.append(row) # Collect all rows for combined memory
-                memory_data[task_name] = task_data
-                logging.info(f"Memory bank loaded from: {filename}")
-            except Exception as e:
-                logging.error(f"Error reading CSV file {filename}: {e}")
-    return memory_data, all_task_data # Return both task-wise and combined data
+    memory_bank = get_memory_bank(memory_folder)
+    return memory_bank.tasks(), memory_bank.task_rows() # Return both task-wise and combined data
 
 def write_memory_bank(memory_folder, task_name, task_data):
     """
@@ -93,11 +106,28 @@ def write_memory_bank(memory_folder, task_name, task_data):
             csv_writer = csv.writer(csvfile)
             csv_writer.writerows(task_data)
         logging.info(f"New databank saved to: {filepath}")
+        get_memory_bank(memory_folder).refresh() # Index the new task right away
         return filepath
     except Exception as e:
         logging.error(f"Error writing to CSV file {filename}: {e}")
         return None
 
+def video_part(video_path, mime_type="video/mp4"):
+    """
+    Returns the request part for a video: inline bytes for small files, otherwise
+    the uploaded file (reusing a previous upload of the same content) once it is ACTIVE.
+    """
+    size = os.path.getsize(video_path)
+    if size <= INLINE_VIDEO_MAX_BYTES:
+        with open(video_path, 'rb') as video_file:
+            return {"mime_type": mime_type, "data": video_file.read()}
+    file = UPLOAD_CACHE.reuse(video_path, lambda name: SCHEDULER.call("file-api", lambda: BACKEND.get_file(name)))
+    if file is None:
+        file = SCHEDULER.call("file-api", lambda: BACKEND.upload_file(video_path, mime_type=mime_type))
+        UPLOAD_CACHE.remember(video_path, file)
+    logging.info(f"Video {video_path} ({size} bytes) sent through the File API as {file.name}")
+    return FILE_POLLER.wait(file)
+
 # --- Action Recording and Analysis Functions ---
 def record_action(csv_writer, task_data, timestamp, action, tool, tool_location=None, tool_status=None):
     """
@@ -116,18 +146,12 @@ def process_video(video_path, csv_writer, task_data, model, memory_data_combined
     logging.info(f"Processing video file using Gemini API with databank context: {video_path}")
 
     try:
-        # --- Prepare video part for Gemini API (Corrected method - read binary) ---
-        with open(video_path, 'rb') as video_file: # Open video file in binary read mode
-            video_data = video_file.read() # Read video file content as bytes
-        video_part = {"mime_type": "video/mp4", "data": video_data}
+        # --- Prepare video part for Gemini API (inline for small files, File API for large ones) ---
+        video_content = video_part(video_path)
 
         # --- Construct Gemini Prompt with Databank Context ---
-        databank_context = ""
-        if memory_data_combined:
-            databank_context = "Here are actions from my past tasks:\n"
-            for row in memory_data_combined:
-                if len(row) > 2: # Basic check to avoid index errors
-                    databank_context += f"- [{row[0]}] {row[1]} using {row[2]}\n" # Simple format, can be improved
+        video_name = os.path.splitext(os.path.basename(video_path))[0]
+        databank_context = MEMORY_CONTEXT.build(memory_data_combined, video_name, "Here are actions from my past tasks:\n")
 
         prompt_text = f"""Analyze the user's actions in this video.
         Identify each action, the tool being used, and provide a timestamp for each action.
@@ -140,11 +164,13 @@ def process_video(video_path, csv_writer, task_data, model, memory_data_combined
         """
 
         # --- Call Gemini API for video analysis ---
-        responses = model.generate_content(
-            model=MODEL_NAME,
-            contents=[video_part, prompt_text], # Video and text prompt as content
-            generation_config=GEMINI_PARAMS
-        )
+        with USAGE_TRACKER.track("video_analysis", MODEL_NAME, video_path) as call:
+            responses = SCHEDULER.call(MODEL_NAME, lambda: BACKEND.generate_content(
+                model,
+                [video_content, prompt_text], # Video and text prompt as content
+                generation_config=GEMINI_PARAMS
+            ), tokens=GEMINI_PARAMS["max_output_tokens"], priority=BATCH, usage=call)
+            call.input_tokens, call.output_tokens = gemini_usage(responses)
 
         gemini_response_text = responses.text # Get text response from Gemini
 
@@ -179,16 +205,13 @@ def process_video(video_path, csv_writer, task_data, model, memory_data_combined
 # --- Instruction Generation and Experience Functions ---
 def generate_instructions_from_memory(csv_writer, memory_folder, task_query):
     """
-    Searches the memory bank for tasks related to the task_query.
+    Searches the memory bank for tasks related to the task_query (BM25 over task
+    names, actions, tools and locations).
     Generates instructions based on the most relevant task found and writes to CSV.
-    (Simple keyword matching for now, can be improved with more sophisticated semantic search)
     """
-    memory_data, _ = read_memory_bank(memory_folder) # Only need task-wise data for instructions
-    relevant_tasks = {}
-
-    for task_name, task_data in memory_data.items():
-        if task_query.lower() in task_name.lower(): # Simple keyword search in task name
-            relevant_tasks[task_name] = task_data
+    memory_bank = get_memory_bank(memory_folder)
+    relevant_tasks = memory_bank.search(task_query, k=INSTRUCTION_TOP_K)
+    logging.info(f"Tasks matching '{task_query}': {', '.join(f'{name} ({score:.2f})' for name, score in relevant_tasks)}")
 
     if not relevant_tasks:
         instruction_message = "No similar tasks found in memory. Please perform the task and I will record it for future reference."
@@ -196,8 +219,8 @@ def generate_instructions_from_memory(csv_writer, memory_folder, task_query):
         logging.info(instruction_message)
         return instruction_message
 
-    best_task_name = list(relevant_tasks.keys())[0] # Take the first relevant task for simplicity
-    best_task_data = relevant_tasks[best_task_name]
+    best_task_name = relevant_tasks[0][0] # Highest-scoring task
+    best_task_data = memory_bank.task(best_task_name)
 
     instructions = f"Instructions for '{task_query}' based on previous experience with '{best_task_name}':\n"
     if best_task_data and len(best_task_data) > 1: # Check if task data is not empty and has action rows (skip header if present)
@@ -250,10 +273,13 @@ def summarize_experience(csv_writer, task_data, model): # Added model as argumen
         # --- Gemini Model for Experience Summarization (Real Application) ---
         prompt_text = f"Summarize the experience of performing the following task. Provide a concise and insightful summary, highlighting any challenges, successes, or key observations.  Here are the actions performed:\n{chr(10).join(action_list_for_prompt)}" # Use newline for better readability in prompt
 
-        response = model.generate_content(
-            prompt_text,
-            generation_config=GEMINI_PARAMS # Use generation_config instead of parameters for gemini-pro
-        )
+        with USAGE_TRACKER.track("summary", MODEL_NAME, "experience_summary") as call:
+            response = SCHEDULER.call(MODEL_NAME, lambda: BACKEND.generate_content(
+                model,
+                prompt_text,
+                generation_config=GEMINI_PARAMS # Use generation_config instead of parameters for gemini-pro
+            ), tokens=GEMINI_PARAMS["max_output_tokens"], priority=BATCH, usage=call)
+            call.input_tokens, call.output_tokens = gemini_usage(response)
         gemini_summary = response.text
         detailed_summary = f"{summary_prefix}Detailed Summary from Gemini:\n{gemini_summary}"
         logging.info(f"--- Gemini Experience Summarization using {MODEL_NAME} ---")
@@ -272,57 +298,87 @@ def header_check(row):
         return False
     return all(isinstance(item, str) for item in row) # Assume header row contains only strings
 
+class QuestionSession:
+    """
+    Q&A session over the memory bank and the video just processed. The model is
+    created and the context built once; each question is a stateless request, so
+    it never sends earlier questions and answers. When the context can be stored
+    as cached content (a model with explicit caching and at least
+    CACHE_MIN_TOKENS of context) a request is just the question; otherwise it is
+    the prebuilt context plus the question, which is the case for MODEL_NAME
+    and MEMORY_CONTEXT_TOKENS as configured.
+    """
+    def __init__(self, memory_data_combined, task_data):
+        actions = [row for row in task_data[1:] if len(row) > 2] if task_data else [] # Skip header
+        query = " ".join(f"{row[1]} {row[2]}" for row in actions)
+        context = MEMORY_CONTEXT.build(memory_data_combined, query, "Here is context from my memory bank (past tasks):\n")
+        if actions:
+            context += "\nHere are the actions from the video I just processed:\n"
+            context += "".join(f"{format_row(row)}\n" for row in actions)
+        session_prompt = f"{QA_INSTRUCTIONS}\n\nContext:\n{context}"
+
+        genai.configure(api_key=GEMINI_API_KEY)
+        self.cache = None
+        rejection = cache_rejection(MODEL_NAME, [session_prompt])
+        if rejection is None:
+            try:
+                self.model, self.cache = BACKEND.cache_context(MODEL_NAME, [session_prompt], QA_CACHE_TTL, GEMINI_PARAMS)
+                self.prefix = []
+                logging.info(f"Q&A context cached as {self.cache.name}")
+            except Exception as e:
+                rejection = str(e)
+        if self.cache is None:
+            logging.info(f"Q&A context not cached ({rejection}); it is sent with every question")
+            self.model = genai.GenerativeModel(model_name=MODEL_NAME, generation_config=GEMINI_PARAMS)
+            self.prefix = [session_prompt]
+        logging.info(f"Gemini Q&A session with '{MODEL_NAME}' started.")
+
+    def ask(self, question):
+        """Asks one question about the context and returns the answer text."""
+        with USAGE_TRACKER.track("question", MODEL_NAME, "question_answering") as call:
+            response = SCHEDULER.call(MODEL_NAME, lambda: BACKEND.generate_content(self.model, self.prefix + [question]), tokens=GEMINI_PARAMS["max_output_tokens"], priority=INTERACTIVE, usage=call)
+            call.input_tokens, call.output_tokens = gemini_usage(response)
+        return response.text
+
+    def close(self):
+        """Deletes the cached context."""
+        if self.cache is not None:
+            try:
+                self.cache.delete()
+            except Exception as e:
+                logging.warning(f"Could not delete cached Q&A context {self.cache.name}: {e}")
+            self.cache = None
+
 def ask_and_answer_question(csv_writer, model, memory_data_combined, task_data):
     """Asks the user if they have more questions and answers using Gemini API."""
-    while True:
-        user_question = input("Do you have any more questions? (Type 'no' or 'done' to finish)\n> ")
-        if user_question.lower() in ["no", "done"]:
-            logging.info("User indicated no more questions.")
-            csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "User Interaction", "No more questions."])
-            break
-
-        logging.info(f"User question: {user_question}")
-
-        try:
-            #reinitialize the model
-            genai.configure(api_key=GEMINI_API_KEY)
-            model = genai.GenerativeModel(model_name=MODEL_NAME)
-            logging.info(f"Gemini model '{MODEL_NAME}' re-initialized successfully.")
-            # --- Construct Gemini Prompt for Question Answering ---
-            context_for_question = ""
-            if memory_data_combined:
-                context_for_question += "Here is context from my memory bank (past tasks):\n"
-                for row in memory_data_combined:
-                    if len(row) > 2:
-                        context_for_question += f"- [{row[0]}] {row[1]} using {row[2]}\n"
-            if task_data and len(task_data) > 1: # Check if task_data has actions
-                context_for_question += "\nHere are the actions from the video I just processed:\n"
-                for row in task_data[1:]: # Skip header
-                    if len(row) > 2:
-                        context_for_question += f"- [{row[0]}] {row[1]} using {row[2]}\n"
-
-            question_prompt = f"""Answer the following question based on the provided context of past tasks and the actions performed in the video I just processed. If the question is not related to the context, please indicate that you cannot answer it based on the given information.
-
-            Context:\n{context_for_question}
-
-            Question: {user_question}
-            """
-
-            response = model.generate_content(
-                question_prompt,
-                generation_config=GEMINI_PARAMS
-            )
-            answer_text = response.text
-            logging.info(f"Gemini Answer: {answer_text}")
-            csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "User Question", user_question])
-            csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "Gemini Answer", answer_text])
-            print(f"Answer: {answer_text}\n") # Print answer to console for user
+    session = None
+    try:
+        while True:
+            user_question = input("Do you have any more questions? (Type 'no' or 'done' to finish)\n> ")
+            if user_question.lower() in ["no", "done"]:
+                logging.info("User indicated no more questions.")
+                csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "User Interaction", "No more questions."])
+                break
+
+            logging.info(f"User question: {user_question}")
 
-        except Exception as e:
-            error_message = f"Error during Gemini question answering: {e}"
-            logging.error(error_message)
-            csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "Error", error_message])
-            print(f"Error answering question. Please check logs.\n")
+            try:
+                if session is None:
+                    session = QuestionSession(memory_data_combined, task_data)
+                answer_text = session.ask(user_question)
+                logging.info(f"Gemini Answer: {answer_text}")
+                csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "User Question", user_question])
+                csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "Gemini Answer", answer_text])
+                print(f"Answer: {answer_text}\n") # Print answer to console for user
+
+            except Exception as e:
+                error_message = f"Error during Gemini question answering: {e}"
+                logging.error(error_message)
+                csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "Error", error_message])
+                print(f"Error answering question. Please check logs.\n")
+    finally:
+        if session is not None:
+            session.close()
 
 
 # --- Main Execution / Example Usage ---
@@ -396,5 +452,6 @@ if __name__ == "__main__":
 
     # --- Close CSV file ---
     csvfile.close()
+    USAGE_TRACKER.write_report(os.path.join(MEMORY_FOLDER, "usage_report.json"))
     logging.info(f"CSV file closed: {CSV_FILE}")
     logging.info(f"--- Task '{task_name}' (Video) Processing Finished ---")
\ No newline at end of file
@@ -3,12 +3,23 @@ import time
 import logging
 import google.generativeai as genai
 from config import GEMINI_API_KEY
-import pandas as pd
 import re
 import csv
-import sys
 import json
+import argparse
+from backends import run_path
+from response_cache import ResponseCache, make_cache_key, RESPONSE_CACHE_FILE
+from run_manifest import RunManifest
+from usage_tracker import USAGE_TRACKER, gemini_usage
+from request_scheduler import SCHEDULER
+from stream_parser import ToolRecordStream, consume_stream
+from json_extract import extract_json_object
+from tool_databank import ToolDatabank
+from result_sink import ResultSink
+from timeline import ClipTimeline, clip_duration, compress_observations, RLE_MAX_GAP_SECONDS
+from tool_schema import TOOL_RESPONSE_SCHEMA, decode_tool_response, to_tool_info_json, render_response_text
 import extract_summary
+from clip_pipeline import run_clip_pipeline, MAX_WORKERS
 
 # Configure logging
 logging.basicConfig(
@@ -23,11 +34,30 @@ logging.basicConfig(
 # Configure Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
 
+# Backend, file poller and upload manifest shared by the Gemini scripts (imported once logging is set up)
+from gemini_files import BACKEND, FILE_POLLER, UPLOAD_CACHE, upload_to_gemini, wait_for_files_active
+
+# Disk-backed cache of model responses keyed on clip, prompt and model config
+RESPONSE_CACHE = ResponseCache(run_path(RESPONSE_CACHE_FILE))
+
 # Define the base path for results
-RESULT_BASE_PATH = "/mnt/logicNAS/Exchange/bosong/tools_results/"
+RESULT_BASE_PATH = run_path("/mnt/logicNAS/Exchange/bosong/tools_results/")
 #RESULT_BASE_PATH = "/mnt/Data/bosong/agent/result_gemini-2.0-flash-thinking-exp-1219"
 DATABANK_FILE = os.path.join(RESULT_BASE_PATH, "tool_databank.csv")
 CSV_FILE = os.path.join(RESULT_BASE_PATH, "gemini_output.csv")
+# One JSON record per clip (clip, content hash, model, config, usage, latency, raw text) in size-rotated segments;
+# each clip is flushed and fsync'ed before the run manifest marks it saved
+RESULT_SINK = ResultSink(os.path.join(RESULT_BASE_PATH, "results"), flush_every=1, fsync=True)
+# Also append responses to CSV_FILE (the legacy layout, still accepted by the fake backend and benchmark_json_extract as canned responses)
+LEGACY_CSV_OUTPUT = True
+RUN_MANIFEST = RunManifest(os.path.join(RESULT_BASE_PATH, "run_manifest.jsonl"))
+# The databank lives in SQLite (event log plus snapshot); DATABANK_FILE (JSON) and DATABANK_CSV_EXPORT are written from it at the end of a run
+DATABANK = ToolDatabank(os.path.join(RESULT_BASE_PATH, "tool_databank.sqlite"))
+DATABANK_CSV_EXPORT = os.path.join(RESULT_BASE_PATH, "tool_databank_export.csv")
+# Identical observations of an object at most this many seconds apart are stored as one interval (None = keep every observation)
+RLE_MAX_GAP = RLE_MAX_GAP_SECONDS
+# Session time at which each clip starts, so tool observations can be placed on one timeline
+CLIP_TIMELINE = ClipTimeline()
 
 # Create the model
 generation_config = {
@@ -38,6 +68,15 @@ generation_config = {
     "response_mime_type": "text/plain",
 }
 
+# Rough tokens per clip request (90 s of video at ~263 tokens/s plus the response) for quota planning
+VIDEO_TOKEN_ESTIMATE = 90 * 263 + generation_config["max_output_tokens"]
+
+# Stream responses and parse tool records while they arrive
+STREAM_RESPONSES = True
+# Characters allowed after the tool JSON has closed before a runaway response is cut off (None = no limit);
+# generous because the task summary follows the JSON
+STREAM_MAX_TAIL_CHARS = 20000
+
 model = genai.GenerativeModel(
     model_name="gemini-2.0-flash-exp",
     #model_name="gemini-2.0-flash-thinking-exp-1219",
@@ -45,24 +84,42 @@ model = genai.GenerativeModel(
     #system_instruction="You are an AI assistant, helping the worker to analyze videos with following all roles. You are a coding expert which has ability with analyse video contents and with annotation you can better understand the user action with interaction with the tools with time stamp in logic, after each movement or actions finished you have ability with remember what was the user doing, which tools does the task need, where is the tools and what is the status of the tools. Use memory bank to remenber  all the necessary information. If in the future another user is asking to do the same task, the agent will able to access the memory bank to have the instrction with the whole task include the tools and actions and other informations."
 )
 
-def wait_for_files_active(files):
-    """Waits for the given files to be active."""
-    logging.info("Waiting for file processing...")
-    for name in (file.name for file in files):
-        file = genai.get_file(name)
-        while file.state.name == "PROCESSING":
-            sys.stdout.write(".")
-            sys.stdout.flush()
-            time.sleep(10)
-            file = genai.get_file(name)
-        if file.state.name != "ACTIVE":
-            logging.error(f"File {file.name} failed to process")
-            raise Exception(f"File {file.name} failed to process")
-    logging.info("...all files ready")
-
-def save_gemini_output(response_text):
-    """Saves Gemini's output to a CSV file."""
+# JSON output mode: the response is a single object matching TOOL_RESPONSE_SCHEMA (no table or prose),
+# with the text-mode prompt and parser kept as the fallback
+STRUCTURED_OUTPUT = True
+structured_generation_config = dict(
+    generation_config,
+    response_mime_type="application/json",
+    response_schema=TOOL_RESPONSE_SCHEMA,
+)
+structured_model = genai.GenerativeModel(
+    model_name="gemini-2.0-flash-exp",
+    generation_config=structured_generation_config,
+)
+
+def save_gemini_output(response_text, video_path=None, output_mode="text", source="generated"):
+    """
+    Saves Gemini's output for a clip to the result sink (and the legacy CSV file).
+    source says where the response came from: generated, cached (response cache) or resumed (run manifest).
+    """
     logging.info("Saving Gemini's output...")
+    if video_path is not None:
+        chat_model, config = (structured_model, structured_generation_config) if output_mode == "json" else (model, generation_config)
+        usage = USAGE_TRACKER.usage_for(video_path, "generation")
+        RESULT_SINK.write(
+            video_path,
+            response_text,
+            content_hash=UPLOAD_CACHE.content_hash(video_path),
+            model=chat_model.model_name,
+            output_mode=output_mode,
+            config=config,
+            usage={field: usage[field] for field in ("calls", "input_tokens", "output_tokens", "retries", "cost_usd")},
+            latency_s=usage["latency_s"] if usage["calls"] else None,
+            cached=source == "cached",
+            resumed=source == "resumed",
+        )
+    if not LEGACY_CSV_OUTPUT:
+        return
     os.makedirs(os.path.dirname(CSV_FILE), exist_ok=True)
     
     with open(CSV_FILE, 'a', newline='', encoding='utf-8') as csvfile:
@@ -86,81 +143,37 @@ def handle_exception(e, context):
     """Logs exception information and context"""
     logging.error(f"Error occurred in {context}: {str(e)}")
 
-def upload_to_gemini(path, mime_type=None):
-    """Uploads the given file to Gemini."""
-    try:
-        file = genai.upload_file(path, mime_type=mime_type)
-        logging.info(f"Uploaded file '{file.display_name}' as: {file.uri}")
-        return file
-    except Exception as e:
-        logging.error(f"Failed to upload file {path}: {str(e)}")
-        return None
-
-def update_databank(new_tool_info):
-    """Updates the databank with new tool information."""
+def manifest_clip_duration(video_path):
+    """Returns a clip's duration, read once and then kept in the run manifest."""
+    duration = RUN_MANIFEST.get(video_path, "duration_s")
+    if duration is None:
+        duration = clip_duration(video_path)
+        RUN_MANIFEST.note(video_path, duration_s=duration)
+    return duration
+
+def update_databank(new_tool_info, clip=None):
+    """
+    Appends one clip's tool records to the databank event log (the snapshot catches up on compaction).
+    Errors are logged and raised, so the clip is not marked committed.
+    """
     try:
         logging.info("update_databank")
-        if os.path.exists(DATABANK_FILE) and os.path.getsize(DATABANK_FILE) > 0:
-            df = pd.read_json(DATABANK_FILE) #bosong, should be json instead of csv
-        else:
-            df = pd.DataFrame(columns=['timestamp', 'object', 'object_type', 'object_color', 'object_size', 'action', 'status', 'location'])
-            logging.warning("Databank file not found or is empty. Creating a new dataframe.")
-        
-    except FileNotFoundError:
-        logging.error("Databank file does not exist. Creating a new dataframe.")
-        df = pd.DataFrame(columns=['timestamp', 'object', 'object_type', 'object_color', 'object_size', 'action', 'status', 'location'])
-    except pd.errors.EmptyDataError:
-        logging.warning("Databank file is empty. Creating a new dataframe.")
-        df = pd.DataFrame(columns=['timestamp', 'object', 'object_type', 'object_color', 'object_size', 'action', 'status', 'location'])
+        if new_tool_info:
+            count = DATABANK.append_events(new_tool_info, clip=clip, clip_offset=CLIP_TIMELINE.offset(clip))
+            logging.info(f"Databank updated successfully: {count} tool observations logged.")
     except Exception as e:
-        handle_exception(e, "reading databank file")
-        return
-    
-    if new_tool_info:
-        for tool_info in new_tool_info:
-            object_name = tool_info['object_name']
-            action = tool_info['action']
-            timestamp = tool_info['timestamp']
-            object_type = tool_info.get('object_type', 'Unknown')
-            object_color = tool_info.get('object_color', 'Unknown')
-            object_size = tool_info.get('object_size', 'Unknown')
-
-            existing_tool = df[df['object'] == object_name]
-            if not existing_tool.empty:
-                df.loc[existing_tool.index, ['timestamp', 'action', 'status']] = [timestamp, action, "Normal"]
-                logging.info(f"Updated information for tool: {object_name}")
-            else:
-                new_row = {
-                    'timestamp': timestamp,
-                    'object_name': object_name, # bosong, change object to object_name
-                    'object_type': object_type,
-                    'object_color': object_color,
-                    'object_size': object_size,
-                    'action': action,
-                    'status': "Normal",
-                    'location': "Unknown"
-                }
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                logging.info(f"Added new tool: {object_name}")
+        handle_exception(e, "updating databank")
+        raise
 
+def export_databank():
+    """Writes the databank to DATABANK_FILE (JSON) and DATABANK_CSV_EXPORT."""
     try:
-        df.to_json(DATABANK_FILE, index=False)#bosong, should be json instead of csv
-        logging.info("Databank updated successfully.")
+        DATABANK.export_json(DATABANK_FILE)
+        DATABANK.export_csv(DATABANK_CSV_EXPORT)
     except Exception as e:
-        handle_exception(e, "writing databank file")
-        
-def process_video(video_path):
-    """Processes a single video"""
-    logging.info(f"Processing video file: {video_path}")
-    files = [upload_to_gemini(video_path, mime_type="video/mp4")]
-    wait_for_files_active(files)
-    chat_session = model.start_chat(
-        history=[
-            {"role": "user", "parts": [files[0],],},
-            {
-                "role": "user",
-                "parts": [
-                    """You are an AI assistant, helping the worker. Analyze the video and identify all instances where the user is holding a tool (e.g., screwdrivers, pliers, wrenches) or an object (e.g., boxes, packaging materials). 
+        handle_exception(e, "exporting databank")
+
+VIDEO_ANALYSIS_PROMPT = """You are an AI assistant, helping the worker. Analyze the video and identify all instances where the user is holding a tool (e.g., screwdrivers, pliers, wrenches) or an object (e.g., boxes, packaging materials). 
                     For each instance, provide detailed information of:
 - Precise timestamps for when the tool or object is held.
 - Detailed descriptions of each action or movement involving the tool or object, including how the user is using it. For example, "using a screwdriver to fasten a bolt."
@@ -193,21 +206,158 @@ Additionally, extract the table data into a JSON/CSV file for subsequent reading
 
 After analyse all videos, shows the summary in detail of the what did the person do(a title of the task), how the person did the task, what tools does the task need, where is all the tools (each used tools location at the end) and what is the status of the tools,the generate text 'Task Summary:' as start, 'End Summary.'as the end. Also give some advise of the task incase another person need to do the task again. 
                     """
-                ]
-            }
-        ]
+
+STRUCTURED_VIDEO_ANALYSIS_PROMPT = """You are an AI assistant, helping the worker. Analyze the video and identify all instances where the user is holding a tool (e.g., screwdrivers, pliers, wrenches) or an object (e.g., boxes, packaging materials).
+For each instance, add one entry to "tools" with:
+- timestamp: precise timestamp when the tool or object is held.
+- action: detailed description of the action or movement involving the tool or object, including how the user is using it. For example, "using a screwdriver to fasten a bolt."
+- object_name, object_type, object_color and object_size: detailed description of the tool or object, including its shape (e.g., round, square, rectangular, irregular) and size (e.g., length, width, height, diameter).
+video_name should be the main information of the video plus the sequence of the video.
+Ensure that repeat frame is minimized: if the action does not change for more than 6 seconds, only include the timestamps for the start, middle, and end of that action.
+In "task_summary", describe what the person did (a title of the task), how the person did the task, what tools the task needs, where all the tools are (each used tool's location at the end) and what the status of the tools is. Also give some advice in case another person needs to do the task again.
+"""
+
+STRUCTURED_VIDEO_ANALYSIS_MESSAGE = "Extract tool and action information from the video following all the rules mentioned."
+
+VIDEO_ANALYSIS_MESSAGE = "Extract tool and action information from the videos with following all roles that mentioned. After analyse all videos, shows the summary in detail of the what did the person do(a title of the task), how the person did the task, what tools does the task need, where is all the tools (each used tools location at the end) and what is the status of the tools. Also give some advise of the task incase another person need to do the task again,the generate text 'Task Summary:' as start, 'End Summary.'as the end."
+
+def analyze_video(video_path):
+    """
+    Runs the chat for a single video (or reuses a cached response) and parses it (safe to run concurrently).
+    Returns (response_text, tool_info_json, output_mode, source), source being generated, cached or resumed.
+    """
+    logging.info(f"Processing video file: {video_path}")
+    tool_stream = ToolRecordStream()
+    response_text = RUN_MANIFEST.get(video_path, "response_text")
+    if response_text is None and STRUCTURED_OUTPUT:
+        try:
+            decoded, cached = generate_structured_response(video_path, tool_stream)
+            response_text = render_response_text(decoded)
+            RUN_MANIFEST.mark(video_path, "generated", response_text=response_text, output_mode="json")
+            RUN_MANIFEST.mark(video_path, "parsed")
+            return response_text, to_tool_info_json(decoded), "json", "cached" if cached else "generated"
+        except ValueError as e:
+            logging.warning(f"JSON output mode failed for {video_path} ({str(e)}), falling back to the text prompt")
+            tool_stream.reset()
+    if response_text is None:
+        cache_key = make_cache_key(
+            UPLOAD_CACHE.content_hash(video_path),
+            [VIDEO_ANALYSIS_PROMPT, VIDEO_ANALYSIS_MESSAGE],
+            model.model_name,
+            generation_config,
+            BACKEND.name,
+        )
+        generated = []
+
+        def generate():
+            generated.append(True)
+            return generate_video_response(video_path, tool_stream)
+
+        response_text = RESPONSE_CACHE.get_or_call(cache_key, generate)
+        RUN_MANIFEST.mark(video_path, "generated", response_text=response_text, output_mode="text")
+        source = "generated" if generated else "cached"
+    else:
+        logging.info(f"Resuming {video_path} from its generated response")
+        source = "resumed"
+    if tool_stream.closed:
+        # Already decoded record by record while streaming
+        tool_info_json = tool_stream.document
+        logging.info(f"First tool record for {video_path} after {tool_stream.first_record_after}s")
+    else:
+        tool_info_json = parse_tool_json(response_text)
+    RUN_MANIFEST.mark(video_path, "parsed")
+    return response_text, tool_info_json, RUN_MANIFEST.get(video_path, "output_mode", "text"), source
+
+def generate_structured_response(video_path, tool_stream=None):
+    """
+    Runs the clip in JSON output mode (or reuses a cached response) and returns
+    (the response decoded, whether it came from the response cache).
+    Raises ValueError if the response does not match the schema; such responses are not cached.
+    """
+    cache_key = make_cache_key(
+        UPLOAD_CACHE.content_hash(video_path),
+        [STRUCTURED_VIDEO_ANALYSIS_PROMPT, STRUCTURED_VIDEO_ANALYSIS_MESSAGE],
+        structured_model.model_name,
+        structured_generation_config,
+        BACKEND.name,
     )
 
-    response = chat_session.send_message("Extract tool and action information from the videos with following all roles that mentioned. After analyse all videos, shows the summary in detail of the what did the person do(a title of the task), how the person did the task, what tools does the task need, where is all the tools (each used tools location at the end) and what is the status of the tools. Also give some advise of the task incase another person need to do the task again,the generate text 'Task Summary:' as start, 'End Summary.'as the end.")
+    generated = []
+
+    def generate():
+        generated.append(True)
+        response_text = generate_video_response(
+            video_path, tool_stream, structured_model, STRUCTURED_VIDEO_ANALYSIS_PROMPT, STRUCTURED_VIDEO_ANALYSIS_MESSAGE
+        )
+        decode_tool_response(response_text)
+        return response_text
+
+    decoded = decode_tool_response(RESPONSE_CACHE.get_or_call(cache_key, generate))
+    return decoded, not generated
+
+def generate_video_response(video_path, tool_stream=None, chat_model=None, prompt=VIDEO_ANALYSIS_PROMPT, message=VIDEO_ANALYSIS_MESSAGE):
+    """Uploads a single video and runs the chat on it, streaming into tool_stream if given."""
+    chat_model = chat_model or model
+    files = [upload_to_gemini(video_path, mime_type="video/mp4")]
+    if files[0] is None:
+        raise RuntimeError(f"Upload of {video_path} failed")
+    RUN_MANIFEST.mark(video_path, "uploaded", file_name=files[0].name)
+    wait_for_files_active(files)
+    RUN_MANIFEST.mark(video_path, "active")
+
+    def start_chat():
+        # A fresh chat per attempt, so a retried request does not carry the failed one in its history
+        return BACKEND.start_chat(
+            chat_model,
+            history=[
+                {"role": "user", "parts": [files[0],],},
+                {
+                    "role": "user",
+                    "parts": [
+                        prompt
+                    ]
+                }
+            ]
+        )
+
+    def send_streaming():
+        response = start_chat().send_message(message, stream=True)
+        return response, consume_stream(response, tool_stream, STREAM_MAX_TAIL_CHARS)
+
+    with USAGE_TRACKER.track("generation", chat_model.model_name, video_path) as call:
+        if STREAM_RESPONSES and tool_stream is not None:
+            response, response_text = SCHEDULER.call(chat_model.model_name, send_streaming, tokens=VIDEO_TOKEN_ESTIMATE, usage=call)
+        else:
+            response = SCHEDULER.call(chat_model.model_name, lambda: start_chat().send_message(message), tokens=VIDEO_TOKEN_ESTIMATE, usage=call)
+            response_text = response.text
+        call.input_tokens, call.output_tokens = gemini_usage(response)
     #data = json.loads(response)
     #response_text=data['candidates']['content']['parts'][0]['text']
     #if is_valid_response(response_text):
     #    save_gemini_output(response_text)
     #    extract_and_update_tools(response_text)
     #else:
-    save_gemini_output(response.text)
-    extract_and_update_tools(response.text)
     #    logging.warning("Received empty or invalid response from Gemini.")
+    return response_text
+
+def commit_video(video_path, result):
+    """
+    Writes the analyzed result of a video to the result sink and the databank (called in clip order).
+    Outputs saved by an earlier attempt whose databank step failed are not written again.
+    """
+    response_text, tool_info_json, output_mode, source = result
+    logging.info(f"Committing results for video file: {video_path}")
+    if RUN_MANIFEST.reached(video_path, "saved"):
+        logging.info(f"Output of {video_path} was already saved, only updating the databank")
+    else:
+        save_gemini_output(response_text, video_path, output_mode, source)
+        RUN_MANIFEST.mark(video_path, "saved")
+    extract_and_update_tools(response_text, tool_info_json, clip=video_path)
+    RUN_MANIFEST.mark(video_path, "committed")
+
+def process_video(video_path):
+    """Processes a single video"""
+    commit_video(video_path, analyze_video(video_path))
 
 def load_tool_info_from_json(json_file):
     """从 JSON 文件加载工具信息并返回列表"""
@@ -226,8 +376,32 @@ def load_tool_info_from_json(json_file):
             logging.error(f"An error occurred while loading tools from {json_file}: {str(e)}")
             return []
 
-def extract_and_update_tools(response_text):
-    """Extracts tool information and updates the databank"""
+def parse_tool_json(response_text):
+    """Parses the tool JSON object out of Gemini's response, returns None if there is none."""
+    try:
+        return extract_json_object(response_text, required_key="tools")
+    except Exception as e:
+        handle_exception(e, "parse_tool_json")
+        return None
+
+def tool_row(tool, video_name=""):
+    """Converts one tool record of a response to a databank row."""
+    return {
+        "video_name": video_name,
+        "object_name": tool.get("object_name", ""),
+        "object_type": tool.get("object_type", ""),
+        "object_color": tool.get("object_color", ""),
+        "object_size": tool.get("object_size", ""),
+        "action": tool.get("action", ""),
+        "timestamp": tool.get("timestamp", "")
+    }
+
+def extract_and_update_tools(response_text, tool_info_json=None, clip=None):
+    """
+    Extracts tool information and updates the databank (from tool_info_json, if it was already decoded while streaming).
+    Parse errors are logged; databank errors are raised.
+    """
+    compressed_tools_info = None
     try:
         logging.info("extract_and_update_tools")
         # 读取文件内容
@@ -235,14 +409,9 @@ def extract_and_update_tools(response_text):
         #with open(file_output, 'r') as file:
         #    response_text = file.read()  # 读取文件内容为字符串
         #logging.info("opened")
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        #json_match=response_text
-        if json_match:
-            json_str = json_match.group(0)
-            # 修复 JSON 字符串中多余的双引号replase "" to  
-            json_str = json_str.replace('""', ' ')
-            # 解析 JSON 字符串
-            tool_info_json = json.loads(json_str)
+        if tool_info_json is None:
+            tool_info_json = parse_tool_json(response_text)
+        if tool_info_json:
             logging.info("matched")
             
             if 'tools' in tool_info_json:
@@ -250,42 +419,9 @@ def extract_and_update_tools(response_text):
                 tools = tool_info_json['tools']
 
                 logging.info(f"Processing video: {video_name}")
-                existing_tools = load_tool_info_from_json(DATABANK_FILE)
-                if not existing_tools:
-                    logging.warning(f"No tools found in {DATABANK_FILE}, attempting to load from secondary CSV file.")
-                    existing_tools = load_tool_info_from_json(CSV_FILE)  # 尝试从第二个 CSV 文件加载
-                
-                logging.info("load_tool_info_from_json databank_file")
-                updated_tools_info = []
-
-                for tool in tools:
-                    logging.info("test point1")
-                    existing_tool = next((t for t in existing_tools if t.get("object_name") == tool.get("object_name")), None)
-                    logging.info("test point2")
-                    if existing_tool:
-                        updated_tool_info = {
-                            "video_name": video_name,
-                            "object_name": tool.get("object_name", ""),
-                            "object_type": tool.get("object_type", tool.get("object_type", existing_tool.get("object_type", ""))),# Example of conditional update
-                            "object_color": tool.get("object_color", tool.get("object_color", existing_tool.get("object_color", ""))), # Example of conditional update
-                            "object_size": tool.get("object_size", tool.get("object_size", existing_tool.get("object_size", ""))), # Example of conditional update
-                            "action": tool.get("action", ""),
-                            "timestamp": tool.get("timestamp", "")
-                        }
-                        updated_tools_info.append(updated_tool_info)
-                    else:
-                        logging.info(f"New tool detected: {tool.get('object_name')}")
-                        updated_tools_info.append({
-                            "video_name": video_name,
-                            "object_name": tool.get("object_name", ""),
-                            "object_type": tool.get("object_type", ""),
-                            "object_color": tool.get("object_color", ""),
-                            "object_size": tool.get("object_size", ""),
-                            "action": tool.get("action", ""),
-                            "timestamp": tool.get("timestamp", "")
-                        })
-
-                save_updated_tools_info(updated_tools_info)
+                updated_tools_info = [tool_row(tool, video_name) for tool in tools]
+                compressed_tools_info = compress_observations(updated_tools_info, RLE_MAX_GAP)
+                logging.info(f"Compressed {len(updated_tools_info)} tool observations into {len(compressed_tools_info)} intervals")
 
             else:
                 logging.warning("No 'tools' key found in JSON response.")
@@ -297,34 +433,43 @@ def extract_and_update_tools(response_text):
     except Exception as e:
         handle_exception(e, "extract_and_update_tools")
 
-def save_updated_tools_info(updated_tools_info):
-    """Save updated tool information to a file or database"""
-    logging.info("save_updated_tools")
-    """Saves updated tools information to a JSON file."""
-    try:
-        # 确定文件路径，确保不使用 JSON 数据作为文件名
-        output_file_path = DATABANK_FILE
-        
-        # 将更新后的工具信息保存为 JSON 文件
-        with open(output_file_path, 'w') as f:
-            json.dump(updated_tools_info, f, indent=4)
-        
-        logging.info(f"Updated tools information saved to {output_file_path}")
-        
-        update_databank(updated_tools_info)
-        logging.info("saved tools into csv now update the tools")
+    if compressed_tools_info is not None:
+        update_databank(compressed_tools_info, clip=clip)
+
+def main(argv=None):
+    global STRUCTURED_OUTPUT, RLE_MAX_GAP, CLIP_TIMELINE
+    parser = argparse.ArgumentParser(description="Extract tool usage from video clips with Gemini.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the response cache.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached responses and overwrite them.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the run manifest and process every clip again.")
+    parser.add_argument("--text-output", action="store_true", help="Use the free-text prompt instead of JSON output mode.")
+    parser.add_argument("--rle-gap", type=float, default=RLE_MAX_GAP, help="Merge identical tool observations at most this many seconds apart (negative keeps every observation).")
+    args = parser.parse_args(argv)
+    STRUCTURED_OUTPUT = STRUCTURED_OUTPUT and not args.text_output
+    RLE_MAX_GAP = args.rle_gap if args.rle_gap is not None and args.rle_gap >= 0 else None
+    RESPONSE_CACHE.enabled = not args.no_cache
+    RESPONSE_CACHE.refresh = args.refresh
+    if args.restart:
+        RUN_MANIFEST.reset()
 
-    except Exception as e:
-        logging.error(f"Error occurred while saving updated tools info: {e}")
-    #pass
-
-def main():
     logging.info("Starting main function...")
     video_folder = "/mnt/logicNAS/Exchange/bosong/tools/"
     video_files = find_and_sort_mp4_files(video_folder)
-
-    for video_path in video_files:
-        process_video(video_path)
+    CLIP_TIMELINE = ClipTimeline(video_files, duration=manifest_clip_duration)
+    pending_files = [v for v in video_files if not RUN_MANIFEST.reached(v, "committed")]
+    if len(pending_files) < len(video_files):
+        logging.info(f"Skipping {len(video_files) - len(pending_files)} clips already committed in {RUN_MANIFEST.manifest_path}")
+
+    DATABANK.start_compaction()
+    run_clip_pipeline(pending_files, analyze_video, commit_video, max_workers=MAX_WORKERS)
+    DATABANK.stop_compaction()
+    RESULT_SINK.close()
+    logging.info(f"Time to ACTIVE per clip: {FILE_POLLER.time_to_active}")
+    logging.info(f"Time to ACTIVE summary: {FILE_POLLER.metrics()}")
+    logging.info(f"Response cache hits: {RESPONSE_CACHE.hits}, misses: {RESPONSE_CACHE.misses}")
+    logging.info(f"Request scheduler: {SCHEDULER.stats()}")
+    USAGE_TRACKER.write_report(os.path.join(RESULT_BASE_PATH, "usage_report.json"))
+    export_databank()
 
     logging.info("Main function completed.")
     logging.info("Extracting task summaries...")
@@ -0,0 +1,115 @@
+import re
+import json
+import logging
+
+# Inside an object only strings and braces matter; strings are matched whole so braces in them are skipped
+_OBJECT_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]', re.DOTALL)
+_DECODER = json.JSONDecoder()
+_FENCE = re.compile(r'^```[A-Za-z]*[ \t]*\n(.*)\n[ \t]*```$', re.DOTALL)
+
+def _repair(candidate):
+    # Some responses use CSV-style doubled quotes inside strings ("said ""stop"""); only tried when the strict parse fails
+    try:
+        return json.loads(candidate.replace('""', ' '))
+    except json.JSONDecodeError as e:
+        logging.warning(f"Skipping undecodable JSON object: {str(e)}")
+        return None
+
+def _pure_json(text):
+    """Fast path: the whole response (optionally in one ```json fence) is a single object."""
+    text = text.strip()
+    fence = _FENCE.match(text)
+    if fence:
+        text = fence.group(1).strip()
+    if not (text.startswith('{') and text.endswith('}')):
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+def _scan_json_objects(text):
+    """
+    Yields (object, nested) for every top-level JSON object in a model response,
+    in order; nested is True for objects found inside a brace that never closes.
+    """
+    if not isinstance(text, str):
+        raise ValueError(f"Expected string input, but got {type(text)}.")
+    document = _pure_json(text)
+    if isinstance(document, dict):
+        yield document, False
+        return
+
+    pos = 0
+    while True:
+        start = text.find('{', pos)
+        if start < 0:
+            return
+        # Well-formed objects are decoded straight from the text by the C decoder
+        try:
+            document, pos = _DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            document = None
+        if isinstance(document, dict):
+            yield document, False
+            continue
+        # Otherwise find where the object ends, keeping the offsets of the open
+        # braces and the spans of the outermost objects closed inside them
+        opened = [start]
+        closed = []
+        pos = start + 1
+        while opened:
+            token = _OBJECT_TOKEN.search(text, pos)
+            if token is None:
+                break
+            pos = token.end()
+            if token.group() == '{':
+                opened.append(token.start())
+            elif token.group() == '}':
+                open_at = opened.pop()
+                while closed and closed[-1][0] > open_at:
+                    closed.pop()
+                closed.append((open_at, pos))
+        if not opened:
+            document = _repair(text[start:pos])
+            if isinstance(document, dict):
+                yield document, False
+            continue
+        # Unclosed object (a stray brace in prose or a truncated response): the
+        # text has been scanned to its end, so only the objects closed inside remain
+        for span_start, span_end in closed:
+            candidate = text[span_start:span_end]
+            try:
+                document = json.loads(candidate)
+            except json.JSONDecodeError:
+                document = _repair(candidate)
+            if isinstance(document, dict):
+                yield document, True
+        return
+
+def iter_json_objects(text):
+    """
+    Yields every top-level JSON object in a model response, in order, in one
+    pass over the text. Prose and ```json fences between objects are skipped
+    and well-formed objects are decoded in place; for malformed ones braces
+    inside JSON strings do not count towards nesting. Objects inside a brace
+    that never closes (a stray brace in prose, a truncated response) are
+    yielded as top-level objects.
+    """
+    for document, _ in _scan_json_objects(text):
+        yield document
+
+def extract_json_object(text, required_key=None):
+    """
+    Returns the first JSON object in a model response that has required_key
+    (falling back to the first object that is not inside an unclosed one, so a
+    truncated response does not yield one of its inner records), or None if
+    there is none.
+    """
+    first = None
+    for document, nested in _scan_json_objects(text):
+        if required_key is None or required_key in document:
+            return document
+        if first is None and not nested:
+            first = document
+    return first
@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from task_index import TaskIndex, task_terms
+
+MEMORY_BANK_SNAPSHOT_DIR = os.path.expanduser("~/.cache/aria/")
+
+def _read_task_file(filepath):
+    """Reads one memory-bank CSV into (header or None, rows)."""
+    with open(filepath, 'r', newline='') as csvfile:
+        csv_reader = csv.reader(csvfile)
+        header = next(csv_reader, None)
+        return header, list(csv_reader)
+
+class MemoryBank:
+    """
+    Parsed view of the CSV files in a memory folder, kept in memory and in a
+    local SQLite snapshot (MEMORY_BANK_SNAPSHOT_DIR, one row per file) keyed by
+    filename, mtime and size.
+    refresh() lists the folder once and re-reads only new or changed files, so a
+    growing folder on the NAS costs one directory listing per load. Files keep
+    their load order and rows of new files are appended to the combined view.
+    Each task's term counts are stored in the snapshot too, and the BM25 index
+    behind search() is updated per added, changed or removed file.
+    """
+    def __init__(self, memory_folder, snapshot_path=None):
+        self.memory_folder = memory_folder
+        if snapshot_path is None:
+            folder_hash = hashlib.sha256(os.path.abspath(memory_folder).encode('utf-8')).hexdigest()[:16]
+            snapshot_path = os.path.join(MEMORY_BANK_SNAPSHOT_DIR, f"memory_bank_{folder_hash}.sqlite")
+        self.snapshot_path = snapshot_path
+        self.files_read = 0
+        self.files_reused = 0
+        self._files = {}  # filename -> {"mtime_ns", "size", "header", "rows", "terms"}
+        self._tasks = {}
+        self._combined = []
+        self._task_rows = []
+        self._index = TaskIndex()
+        self._folder_mtime_ns = None
+        self._lock = threading.Lock()
+        self._load_snapshot()
+
+    def _connection(self):
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        con = sqlite3.connect(self.snapshot_path)
+        con.execute("CREATE TABLE IF NOT EXISTS files(filename TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, entry TEXT)")
+        return con
+
+    def _load_snapshot(self):
+        try:
+            con = self._connection()
+            try:
+                rows = con.execute("SELECT filename, entry FROM files ORDER BY rowid").fetchall()
+            finally:
+                con.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Ignoring unreadable memory bank snapshot {self.snapshot_path}: {e}")
+            return
+        self._files = {filename: json.loads(entry) for filename, entry in rows}
+        self._rebuild_views()
+        for filename, entry in self._files.items():
+            self._index.add(filename[:-4], entry["terms"])
+
+    def _save_snapshot(self, updated, removed):
+        """Writes the rows of updated files and deletes those of removed files."""
+        con = self._connection()
+        try:
+            with con:
+                con.executemany("DELETE FROM files WHERE filename = ?", [(filename,) for filename in removed])
+                con.executemany(
+                    "INSERT OR REPLACE INTO files(filename, mtime_ns, size, entry) VALUES (?, ?, ?, ?)",
+                    [(filename, self._files[filename]["mtime_ns"], self._files[filename]["size"], json.dumps(self._files[filename])) for filename in updated],
+                )
+        finally:
+            con.close()
+
+    def _task_data(self, entry):
+        return ([entry["header"]] if entry["header"] else []) + entry["rows"]
+
+    def _rebuild_views(self):
+        self._tasks = {filename[:-4]: self._task_data(entry) for filename, entry in self._files.items()}
+        self._combined = [row for entry in self._files.values() for row in entry["rows"]]
+        self._task_rows = [(filename[:-4], row) for filename, entry in self._files.items() for row in entry["rows"]]
+
+    def refresh(self):
+        """Re-reads new or changed CSV files and drops deleted ones; returns the number of files read."""
+        with self._lock:
+            if not os.path.exists(self.memory_folder):
+                os.makedirs(self.memory_folder)
+                logging.info(f"Memory folder created: {self.memory_folder}")
+            self._folder_mtime_ns = os.stat(self.memory_folder).st_mtime_ns
+            listing = {}
+            with os.scandir(self.memory_folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".csv") and entry.is_file():
+                        stat = entry.stat()
+                        listing[entry.name] = (stat.st_mtime_ns, stat.st_size)
+
+            removed = [filename for filename in self._files if filename not in listing]
+            changed = []
+            added = []
+            for filename, (mtime_ns, size) in listing.items():
+                cached = self._files.get(filename)
+                if cached is not None and (cached["mtime_ns"], cached["size"]) == (mtime_ns, size):
+                    self.files_reused += 1
+                    continue
+                try:
+                    header, rows = _read_task_file(os.path.join(self.memory_folder, filename))
+                except Exception as e:
+                    logging.error(f"Error reading CSV file {filename}: {e}")
+                    continue
+                (changed if cached is not None else added).append(filename)
+                terms = task_terms(filename[:-4], rows)
+                self._files[filename] = {"mtime_ns": mtime_ns, "size": size, "header": header, "rows": rows, "terms": terms}
+                self._index.add(filename[:-4], terms)
+                self.files_read += 1
+                logging.info(f"Memory bank loaded from: {filename}")
+            for filename in removed:
+                del self._files[filename]
+                self._index.remove(filename[:-4])
+
+            if removed or changed:
+                self._rebuild_views()
+            else:
+                for filename in added:
+                    entry = self._files[filename]
+                    self._tasks[filename[:-4]] = self._task_data(entry)
+                    self._combined.extend(entry["rows"])
+                    self._task_rows.extend((filename[:-4], row) for row in entry["rows"])
+            if removed or changed or added:
+                self._save_snapshot(changed + added, removed)
+            return len(changed) + len(added)
+
+    def tasks(self):
+        """Returns {task name: rows including the header row} (shared, treat as read-only)."""
+        self.refresh()
+        return self._tasks
+
+    def task(self, task_name):
+        """Returns one task's rows including the header row, or None."""
+        return self.tasks().get(task_name)
+
+    def combined(self):
+        """Returns the rows of all tasks without header rows (shared, treat as read-only)."""
+        self.refresh()
+        return self._combined
+
+    def task_rows(self):
+        """Returns (task name, row) pairs for the rows of all tasks, in combined() order (shared, treat as read-only)."""
+        self.refresh()
+        return self._task_rows
+
+    def search(self, query, k=5):
+        """
+        Returns the top k (task name, BM25 score) pairs for a query over task names,
+        actions, tools and locations. Only refreshes when files were added or removed
+        (the folder mtime changed); call refresh() to pick up files edited in place.
+        """
+        try:
+            folder_mtime_ns = os.stat(self.memory_folder).st_mtime_ns
+        except FileNotFoundError:
+            folder_mtime_ns = None
+        if folder_mtime_ns is None or folder_mtime_ns != self._folder_mtime_ns:
+            self.refresh()
+        with self._lock:
+            return self._index.search(query, k)
@@ -3,11 +3,11 @@ import time
 import logging
 import google.generativeai as genai
 from config import GEMINI_API_KEY
-import pandas as pd
 import re
 import csv
-import sys
-import json
+from backends import run_path
+from usage_tracker import USAGE_TRACKER, gemini_usage
+from request_scheduler import SCHEDULER
 
 # Configure logging
 logging.basicConfig(
@@ -22,40 +22,16 @@ logging.basicConfig(
 # Configure Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
 
+# Backend, file poller and upload manifest shared by the Gemini scripts (imported once logging is set up)
+from gemini_files import BACKEND, upload_to_gemini, wait_for_files_active
+
 # Define the base path for results
-RESULT_BASE_PATH = "/mnt/Data/bosong/agent/test"
+RESULT_BASE_PATH = run_path("/mnt/Data/bosong/agent/test")
 
 
 # Define the path to your CSV file
 CSV_FILE = os.path.join(RESULT_BASE_PATH, "gemini_output.csv")
 
-def upload_to_gemini(path, mime_type=None):
-    """Uploads the given file to Gemini."""
-    try:
-        file = genai.upload_file(path, mime_type=mime_type)
-        logging.info(f"Uploaded file '{file.display_name}' as: {file.uri}")
-        return file
-    except Exception as e:
-        logging.error(f"Failed to upload file {path}: {str(e)}")
-        return None
-
-def wait_for_files_active(files):
-    """Waits for the given files to be active."""
-    logging.info("Waiting for file processing...")
-    for name in (file.name for file in files):
-        file = genai.get_file(name)
-        while file.state.name == "PROCESSING":
-            # 使用 sys.stdout.write() 来输出点而不换行
-            sys.stdout.write(".")
-            sys.stdout.flush()  # 立即刷新输出
-            time.sleep(10)
-            file = genai.get_file(name)
-        if file.state.name != "ACTIVE":
-            logging.error(f"File {file.name} failed to process")
-            raise Exception(f"File {file.name} failed to process")
-    logging.info("...all files ready")
-    logging.info("")  # 为了更好的可读性添加换行
-
 # Create the model
 generation_config = {
     "temperature": 0.2,#
@@ -104,12 +80,20 @@ def main():
         logging.info(f"Processing video file: {video_path}")
         # Upload the video file
         files = [upload_to_gemini(video_path, mime_type="video/mp4")]
+        if files[0] is None:
+            logging.error(f"Skipping {video_path}: upload failed")
+            continue
 
         # Wait for the file to be ready
-        wait_for_files_active(files)
+        try:
+            wait_for_files_active(files)
+        except Exception as e:
+            logging.error(f"Skipping {video_path}: {str(e)}")
+            continue
         # Start a chat session
         logging.info("Starting chat session...")
-        chat_session = model.start_chat(
+        chat_session = BACKEND.start_chat(
+            model,
             history=[
                 {
                     "role": "user",
@@ -130,7 +114,9 @@ def main():
 
         # Send the message to Gemini
         logging.info("Sending message to Gemini...")
-        response = chat_session.send_message("Extract  information from the videos.")
+        with USAGE_TRACKER.track("generation", model.model_name, video_path) as call:
+            response = SCHEDULER.call(model.model_name, lambda: chat_session.send_message("Extract  information from the videos."), usage=call)
+            call.input_tokens, call.output_tokens = gemini_usage(response)
 
         # Save Gemini's output
         save_gemini_output(response.text)
@@ -142,6 +128,8 @@ def main():
         
 
     
+    logging.info(f"Request scheduler: {SCHEDULER.stats()}")
+    USAGE_TRACKER.write_report(os.path.join(RESULT_BASE_PATH, "usage_report.json"))
     logging.info("Main function completed.")
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+
+# Priority lanes: interactive questions are served before batch clip/frame jobs
+INTERACTIVE = 0
+BATCH = 1
+
+# Per-model quota as (requests per minute, tokens per minute); matched by model name prefix
+MODEL_LIMITS = {
+    "gemini-2.0-flash-thinking": (10, 4_000_000),
+    "gemini-2.0-flash": (10, 4_000_000),
+    "gemini-1.5-pro": (360, 4_000_000),
+    "gemini-1.5-flash": (1000, 4_000_000),
+    "file-api": (600, None),
+    "mistral": (60, 500_000),
+}
+DEFAULT_LIMITS = (60, 1_000_000)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# The File API answers 403 rather than 404 for files that were deleted or have expired
+NOT_FOUND_STATUS = {403, 404}
+
+class HTTPStatusError(Exception):
+    """Raised for a non-200 HTTP status from an endpoint that does not raise its own exception type."""
+    def __init__(self, code, message, retry_after=None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.retry_after = retry_after
+
+def _status_code(e):
+    for attr in ("code", "status", "status_code"):
+        value = getattr(e, attr, None)
+        if isinstance(value, int):
+            return value
+    if type(e).__name__ == "ResourceExhausted" or str(e).startswith("429"):
+        return 429
+    return None
+
+def is_rate_limited(e):
+    """Returns True if the exception is a rate-limit (429) error."""
+    return _status_code(e) == 429
+
+def is_not_found(e):
+    """Returns True if the exception says the requested resource does not exist."""
+    return _status_code(e) in NOT_FOUND_STATUS
+
+def is_retryable(e):
+    """Returns True for rate limits, transient server errors and connection problems."""
+    return _status_code(e) in RETRYABLE_STATUS or isinstance(e, (TimeoutError, ConnectionError))
+
+def retry_after(e):
+    """Returns the Retry-After delay in seconds carried by an exception, if any."""
+    value = getattr(e, "retry_after", None)
+    if value is None:
+        headers = getattr(e, "headers", None) or {}
+        value = headers.get("Retry-After") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Bucket holding up to one minute of quota, refilled continuously."""
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.available = float(per_minute) if per_minute else 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.capacity:
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount can be taken (0 if it can be taken now)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60.0 / self.capacity
+
+    def take(self, amount, now):
+        if self.capacity:
+            self._refill(now)
+            self.available -= min(amount, self.capacity)
+
+class _Lane:
+    def __init__(self, limits):
+        self.requests = TokenBucket(limits[0])
+        self.tokens = TokenBucket(limits[1])
+        self.waiting = []
+        self.paused_until = 0.0
+        self.completed = 0
+        self.retries = 0
+
+class RequestScheduler:
+    """
+    Central gate for remote model calls.
+    Each model gets requests-per-minute and tokens-per-minute buckets and a
+    priority queue of waiting callers; 429s pause the whole model lane for the
+    Retry-After delay and failed calls are retried with exponential backoff.
+    """
+    def __init__(self, limits=None, max_retries=5, base_backoff=1.0, max_backoff=60.0):
+        self.limits = dict(MODEL_LIMITS if limits is None else limits)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lanes = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def _limits_for(self, model):
+        name = model.split("/")[-1]
+        for prefix, limits in self.limits.items():
+            if name.startswith(prefix):
+                return limits
+        return DEFAULT_LIMITS
+
+    def _lane(self, model):
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _Lane(self._limits_for(model))
+        return lane
+
+    def queue_depth(self):
+        """Returns the number of callers waiting per model."""
+        with self._cond:
+            return {model: len(lane.waiting) for model, lane in self._lanes.items() if lane.waiting}
+
+    def stats(self):
+        """Returns completed calls, retries and queue depth per model."""
+        with self._cond:
+            return {
+                model: {"completed": lane.completed, "retries": lane.retries, "waiting": len(lane.waiting)}
+                for model, lane in self._lanes.items()
+            }
+
+    def acquire(self, model, tokens=0, priority=BATCH):
+        """Blocks until the caller is first in its model's queue and the quota allows the request."""
+        with self._cond:
+            lane = self._lane(model)
+            entry = (priority, next(self._seq))
+            heapq.heappush(lane.waiting, entry)
+            logged = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    if lane.waiting[0] == entry:
+                        wait = max(
+                            lane.paused_until - now,
+                            lane.requests.wait_time(1, now),
+                            lane.tokens.wait_time(tokens, now),
+                        )
+                        if wait <= 0:
+                            lane.requests.take(1, now)
+                            lane.tokens.take(tokens, now)
+                            return
+                    else:
+                        wait = None
+                    if not logged:
+                        logging.info(f"Waiting for {model} quota, queue depth {len(lane.waiting)}")
+                        logged = True
+                    self._cond.wait(wait)
+            finally:
+                lane.waiting.remove(entry)
+                heapq.heapify(lane.waiting)
+                self._cond.notify_all()
+
+    def _after_failure(self, model, e, attempt):
+        """Returns the delay before the next attempt and pauses the lane on 429."""
+        delay = retry_after(e)
+        if delay is None:
+            delay = min(self.max_backoff, self.base_backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+        with self._cond:
+            lane = self._lane(model)
+            lane.retries += 1
+            if is_rate_limited(e):
+                lane.paused_until = max(lane.paused_until, time.monotonic() + delay)
+                self._cond.notify_all()
+        logging.warning(f"{model} call failed ({str(e)}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def _completed(self, model):
+        with self._cond:
+            self._lane(model).completed += 1
+
+    def call(self, model, fn, tokens=0, priority=BATCH, usage=None):
+        """
+        Runs fn() under the model's quota, retrying retryable errors.
+        If usage (e.g. from USAGE_TRACKER.track) is given, its retries counter is updated.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(model, tokens, priority)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                if usage is not None:
+                    usage.retries += 1
+                time.sleep(self._after_failure(model, e, attempt))
+                continue
+            self._completed(model)
+            return result
+
+    async def call_async(self, model, coro_fn, tokens=0, priority=BATCH, usage=None):
+        """Async variant of call(); coro_fn() must return a new coroutine for every attempt."""
+        for attempt in range(self.max_retries + 1):
+            await asyncio.to_thread(self.acquire, model, tokens, priority)
+            try:
+                result = await coro_fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                if usage is not None:
+                    usage.retries += 1
+                await asyncio.sleep(self._after_failure(model, e, attempt))
+                continue
+            self._completed(model)
+            return result
+
+# Shared scheduler for all remote calls in this process
+SCHEDULER = RequestScheduler()
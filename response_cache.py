@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+RESPONSE_CACHE_FILE = os.path.expanduser("~/.cache/aria/responses.sqlite")
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+def make_cache_key(clip_hash, prompt, model_name, generation_config, backend="gemini"):
+    """Builds the cache key from the clip content hash, the full prompt/history text, the model config and the backend."""
+    key = {
+        "clip": clip_hash,
+        "prompt": prompt,
+        "model": model_name,
+        "config": generation_config,
+    }
+    if backend != "gemini":
+        # Only other backends are named, so keys of real responses cached earlier stay valid
+        key["backend"] = backend
+    payload = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Disk-backed cache of model responses stored in SQLite.
+    Entries are evicted least-recently-used first once the total size of the
+    cached responses exceeds max_bytes. With enabled=False the cache is bypassed
+    completely; with refresh=True cached entries are ignored but overwritten.
+    """
+    def __init__(self, db_path=RESPONSE_CACHE_FILE, max_bytes=RESPONSE_CACHE_MAX_BYTES, enabled=True, refresh=False):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._con = None
+
+    def _connection(self):
+        if self._con is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._con = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS responses("
+                "key TEXT PRIMARY KEY, response_text TEXT, size INTEGER, created REAL, last_used REAL)"
+            )
+            self._con.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+            self._con.commit()
+        return self._con
+
+    def get(self, key):
+        """Returns the cached response text for a key, or None."""
+        if not self.enabled or self.refresh:
+            return None
+        with self._lock:
+            con = self._connection()
+            row = con.execute("SELECT response_text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            con.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            con.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response_text):
+        """Stores a response and evicts the least recently used entries above max_bytes."""
+        if not self.enabled or response_text is None:
+            return
+        size = len(response_text.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            con = self._connection()
+            con.execute(
+                "INSERT OR REPLACE INTO responses(key, response_text, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response_text, size, now, now),
+            )
+            total = con.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                for old_key, old_size in con.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes or old_key == key:
+                        break
+                    con.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= old_size
+                    evicted += 1
+                logging.info(f"Response cache evicted {evicted} entries")
+            con.commit()
+
+    def get_or_call(self, key, call):
+        """Returns the cached response for key, or runs call() and caches its text."""
+        cached = self.get(key)
+        if cached is not None:
+            logging.info(f"Response cache hit: {key[:12]}")
+            return cached
+        response_text = call()
+        self.put(key, response_text)
+        return response_text
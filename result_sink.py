@@ -0,0 +1,189 @@
+import os
+import io
+import gzip
+import json
+import time
+import logging
+import threading
+
+RESULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+class ResultSink:
+    """
+    Writes one JSON record per clip to size-rotated segment files
+    (<prefix>-000001.jsonl, or .jsonl.gz with one gzip member per record).
+    Records are buffered and written every flush_every records or on flush();
+    with fsync=True each flush is fsync'ed. After the data, each record's
+    (clip, segment, offset, length) is appended to <prefix>.index.jsonl so
+    ResultReader can seek to a clip without parsing the segments.
+    """
+    def __init__(self, folder, prefix="gemini_output", max_segment_bytes=RESULT_SEGMENT_MAX_BYTES, compress=False, flush_every=1, fsync=True):
+        self.folder = folder
+        self.prefix = prefix
+        self.max_segment_bytes = max_segment_bytes
+        self.compress = compress
+        self.flush_every = flush_every
+        self.fsync = fsync
+        self.index_path = os.path.join(folder, f"{prefix}.index.jsonl")
+        self._pending = []
+        self._lock = threading.Lock()
+        self._segment = None
+        self._size = 0
+
+    def _segments(self):
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        return sorted(f for f in os.listdir(self.folder) if f.startswith(self.prefix + "-") and f.endswith(suffix))
+
+    def _open_segment(self):
+        """Picks the segment to append to: the last one, unless it is full."""
+        os.makedirs(self.folder, exist_ok=True)
+        segments = self._segments()
+        if segments:
+            last = segments[-1]
+            size = os.path.getsize(os.path.join(self.folder, last))
+            if size < self.max_segment_bytes:
+                return last, size
+            number = int(last[len(self.prefix) + 1:].split(".")[0]) + 1
+        else:
+            number = 1
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        return f"{self.prefix}-{number:06d}{suffix}", 0
+
+    def _encode(self, record):
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        return gzip.compress(data) if self.compress else data
+
+    def write(self, clip, response_text, **fields):
+        """Buffers one clip's record (clip, written_at, the given fields and response_text)."""
+        record = {"clip": clip, "written_at": time.time(), **fields, "response_text": response_text}
+        with self._lock:
+            self._pending.append(record)
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        """Writes buffered records to the segment and the index."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        if self._segment is None:
+            self._segment, self._size = self._open_segment()
+        entries = []
+        data = io.BytesIO()
+        for record in self._pending:
+            if self._size > 0 and self._size + data.tell() >= self.max_segment_bytes:
+                self._write_segment(data.getvalue())
+                data = io.BytesIO()
+                self._segment, self._size = self._open_segment()
+            encoded = self._encode(record)
+            entries.append({"clip": record["clip"], "segment": self._segment, "offset": self._size + data.tell(), "length": len(encoded)})
+            data.write(encoded)
+        self._write_segment(data.getvalue())
+        self._append_index(entries)
+        logging.info(f"Result sink wrote {len(self._pending)} records to {self._segment}")
+        self._pending = []
+
+    def _write_segment(self, data):
+        if not data:
+            return
+        with open(os.path.join(self.folder, self._segment), 'ab') as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._size += len(data)
+
+    def _append_index(self, entries):
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def close(self):
+        self.flush()
+
+class ResultReader:
+    """
+    Reads records written by ResultSink, by clip through the index or all of them
+    in write order. The {clip: entry} map is kept and extended with the index
+    lines appended since the last lookup, so lookups do not re-read the index.
+    """
+    def __init__(self, folder, prefix="gemini_output"):
+        self.folder = folder
+        self.prefix = prefix
+        self.index_path = os.path.join(folder, f"{prefix}.index.jsonl")
+        self._clips = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _entries_from(self, offset):
+        """Returns (index entries after byte offset, offset after the last complete line)."""
+        if not os.path.exists(self.index_path):
+            return [], offset
+        with open(self.index_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        return [json.loads(line) for line in data[:end].splitlines() if line.strip()], offset + end
+
+    def index(self):
+        """Returns the index entries in write order (a torn last line is ignored)."""
+        entries = []
+        if not os.path.exists(self.index_path):
+            return entries
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping torn line in {self.index_path}")
+        return entries
+
+    def read_from(self, offset=0):
+        """
+        Returns (records, offset): the records indexed after byte offset in the
+        index file, and the offset to resume from next time (a torn last line is
+        left for the next call).
+        """
+        entries, offset = self._entries_from(offset)
+        return [self.read_entry(entry) for entry in entries], offset
+
+    def clips(self):
+        """Returns {clip: latest index entry} (shared, treat as read-only)."""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.index_path)
+            except FileNotFoundError:
+                size = 0
+            if size < self._offset:
+                # The index was replaced or truncated; start over
+                self._clips, self._offset = {}, 0
+            if size > self._offset:
+                entries, self._offset = self._entries_from(self._offset)
+                for entry in entries:
+                    self._clips[entry["clip"]] = entry
+            return self._clips
+
+    def read_entry(self, entry):
+        """Reads the record an index entry points to."""
+        with open(os.path.join(self.folder, entry["segment"]), 'rb') as f:
+            f.seek(entry["offset"])
+            data = f.read(entry["length"])
+        if entry["segment"].endswith(".gz"):
+            data = gzip.decompress(data)
+        return json.loads(data.decode('utf-8'))
+
+    def get(self, clip):
+        """Returns the latest record for a clip, or None."""
+        entry = self.clips().get(clip)
+        return self.read_entry(entry) if entry is not None else None
+
+    def __iter__(self):
+        """Yields every record in write order."""
+        for entry in self.index():
+            yield self.read_entry(entry)
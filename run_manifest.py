@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Per-clip stages in the order they are completed
+# ("saved": the response is in the result sink and the CSV; "committed": the databank has it too)
+STAGES = ["uploaded", "active", "generated", "parsed", "saved", "committed"]
+
+def _later(current, stage):
+    """Returns the later of two stages (a clip never goes back to an earlier one)."""
+    if current is None or STAGES.index(stage) >= STAGES.index(current):
+        return stage
+    return current
+
+class RunManifest:
+    """
+    Append-only JSONL log of per-clip progress for a batch run.
+    Every completed stage is appended as one line, so a restarted run can skip
+    committed clips and resume partial clips from their last completed stage.
+    A clip's stage only moves forward, also when an earlier stage is run again.
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self.clips = {}  # clip path -> {"stage": ..., <data recorded by earlier stages>}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write; everything before it is intact
+                    logging.warning(f"Skipping unreadable line in run manifest {self.manifest_path}")
+                    continue
+                clip = self.clips.setdefault(record["clip"], {})
+                clip.update(record.get("data", {}))
+                if record.get("stage"):
+                    clip["stage"] = _later(clip.get("stage"), record["stage"])
+            torn = f.tell() > 0 and not line.endswith("\n")
+        if torn:
+            # Terminate the torn line so the next record starts on a line of its own
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write("\n")
+        logging.info(f"Run manifest loaded: {len(self.clips)} clips, {sum(1 for c in self.clips.values() if c.get('stage') == 'committed')} committed")
+
+    def mark(self, clip, stage, **data):
+        """Records that a clip has completed a stage, with optional data needed to resume from it."""
+        record = {"clip": clip, "stage": stage, "time": time.strftime("%Y-%m-%d %H:%M:%S"), "data": data}
+        with self._lock:
+            entry = self.clips.setdefault(clip, {})
+            entry.update(data)
+            entry["stage"] = _later(entry.get("stage"), stage)
+            os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+
+    def note(self, clip, **data):
+        """Records data about a clip (e.g. its duration) without completing a stage."""
+        record = {"clip": clip, "stage": None, "time": time.strftime("%Y-%m-%d %H:%M:%S"), "data": data}
+        with self._lock:
+            self.clips.setdefault(clip, {}).update(data)
+            os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+
+    def reached(self, clip, stage):
+        """Returns True if the clip has completed the given stage (or a later one)."""
+        with self._lock:
+            current = self.clips.get(clip, {}).get("stage")
+        return current is not None and STAGES.index(current) >= STAGES.index(stage)
+
+    def get(self, clip, key, default=None):
+        """Returns data recorded for a clip by an earlier stage."""
+        with self._lock:
+            return self.clips.get(clip, {}).get(key, default)
+
+    def reset(self):
+        """Forgets all progress and removes the manifest file."""
+        with self._lock:
+            self.clips = {}
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
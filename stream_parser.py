@@ -0,0 +1,131 @@
+import json
+import time
+import logging
+
+class ToolRecordStream:
+    """
+    Incremental parser for a streamed model response.
+    Text chunks are fed as they arrive; every element of the top-level
+    object's "tools" array is decoded as soon as its closing brace arrives and
+    passed to on_record. Once the top-level object has closed, closed is True
+    and document holds the decoded object.
+    """
+    def __init__(self, on_record=None, array_key="tools"):
+        self.on_record = on_record
+        self.array_key = array_key
+        self.reset()
+
+    def reset(self):
+        """Forgets everything fed so far (e.g. before a retried request)."""
+        self.text = ""
+        self.records = []
+        self.closed = False
+        self.document = None
+        self.started = time.monotonic()
+        self.first_record_after = None
+        self._pos = 0
+        self._end = None
+        self._reset_scanner()
+
+    def _reset_scanner(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._top_start = None
+        self._array_depth = None
+        self._record_start = None
+
+    @property
+    def tail_chars(self):
+        """Number of characters received after the top-level object closed."""
+        return 0 if self._end is None else len(self.text) - self._end
+
+    def feed(self, chunk):
+        """Consumes the next chunk of response text and returns the records completed by it."""
+        self.text += chunk
+        text = self.text
+        completed = []
+        i = self._pos
+        while i < len(text) and not self.closed:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start + 1:i]
+            elif self._top_start is None:
+                if c == '{':
+                    self._top_start = i
+                    self._depth = 1
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == '[' or c == '{':
+                if c == '[' and self._depth == 1 and self._last_string == self.array_key:
+                    self._array_depth = 2
+                elif c == '{' and self._array_depth is not None and self._depth == self._array_depth:
+                    self._record_start = i
+                self._depth += 1
+            elif c == ']' or c == '}':
+                self._depth -= 1
+                if c == '}' and self._record_start is not None and self._depth == self._array_depth:
+                    record = self._emit(text[self._record_start:i + 1])
+                    if record is not None:
+                        completed.append(record)
+                    self._record_start = None
+                elif c == ']' and self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self._array_depth = None
+                if self._depth == 0:
+                    self._close(text[self._top_start:i + 1], i + 1)
+            i += 1
+        self._pos = i
+        return completed
+
+    def _emit(self, record_text):
+        try:
+            record = json.loads(record_text)
+        except json.JSONDecodeError as e:
+            logging.warning(f"Skipping undecodable streamed tool record: {str(e)}")
+            return None
+        if self.first_record_after is None:
+            self.first_record_after = time.monotonic() - self.started
+        self.records.append(record)
+        if self.on_record is not None:
+            self.on_record(record)
+        return record
+
+    def _close(self, document_text, end):
+        try:
+            document = json.loads(document_text)
+        except json.JSONDecodeError:
+            document = None
+        if isinstance(document, dict) and self.array_key in document:
+            self.closed = True
+            self.document = document
+            self._end = end
+        else:
+            # Not the tool object (e.g. braces in the prose before it); keep looking
+            self._reset_scanner()
+
+def consume_stream(response, tool_stream, max_tail_chars=None):
+    """
+    Feeds a streamed response into tool_stream chunk by chunk and returns the
+    text received. If max_tail_chars is set, the stream is cut off once that
+    many characters have arrived after the tool JSON closed.
+    """
+    tool_stream.reset()
+    parts = []
+    for chunk in response:
+        text = chunk.text
+        parts.append(text)
+        tool_stream.feed(text)
+        if tool_stream.closed and max_tail_chars is not None and tool_stream.tail_chars > max_tail_chars:
+            logging.warning(f"Cutting off response {tool_stream.tail_chars} characters after the tool JSON closed")
+            break
+    return "".join(parts)
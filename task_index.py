@@ -0,0 +1,99 @@
+import re
+import math
+import heapq
+import functools
+from collections import Counter
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Task-name terms count this many times, since file names are usually the task title
+NAME_WEIGHT = 3
+
+_CAMEL = re.compile(r'(?<=[a-z])(?=[A-Z])')
+_WORD = re.compile(r'[a-z]+')
+_STOPWORDS = {"a", "an", "and", "the", "to", "of", "in", "on", "for", "with", "from", "how", "do", "i", "is", "it", "at", "by", "databank", "csv"}
+_SUFFIXES = ("ing", "ed", "es", "s", "e")
+
+@functools.lru_cache(maxsize=65536)
+def _stem(word):
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text):
+    """Splits text (including CamelCase and snake_case names) into stemmed lowercase terms without stopwords or numbers."""
+    words = _WORD.findall(_CAMEL.sub(" ", str(text)).lower())
+    return [_stem(word) for word in words if word not in _STOPWORDS]
+
+def task_terms(task_name, rows):
+    """Term counts of a task: its name (weighted) plus the action, tool and location of every row."""
+    terms = Counter()
+    for term in tokenize(task_name):
+        terms[term] += NAME_WEIGHT
+    for row in rows:
+        terms.update(tokenize(" ".join(row[1:4])))
+    return terms
+
+class TaskIndex:
+    """
+    In-memory BM25 inverted index over tasks. add() and remove() update the
+    postings in place, so the index grows with the memory bank instead of
+    being rebuilt; search() only touches the postings of the query terms.
+    """
+    def __init__(self):
+        self._postings = {}  # term -> {task name: term count}
+        self._lengths = {}  # task name -> total term count
+        self._terms = {}  # task name -> indexed terms
+        self._total_length = 0
+        self._norms = None  # task name -> BM25 length norm, recomputed after changes
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, task_name, terms):
+        """Indexes a task from its term counts (see task_terms), replacing any previous version."""
+        self.remove(task_name)
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[task_name] = count
+        length = sum(terms.values())
+        self._lengths[task_name] = length
+        self._terms[task_name] = list(terms)
+        self._total_length += length
+        self._norms = None
+
+    def remove(self, task_name):
+        """Removes a task from the index (no-op if it is not indexed)."""
+        length = self._lengths.pop(task_name, None)
+        if length is None:
+            return
+        self._total_length -= length
+        self._norms = None
+        for term in self._terms.pop(task_name):
+            postings = self._postings[term]
+            del postings[task_name]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query, k=5):
+        """Returns the top k (task name, score) pairs for a free-text query, best first."""
+        count = len(self._lengths)
+        if not count:
+            return []
+        if self._norms is None:
+            average_length = self._total_length / count
+            self._norms = {
+                task_name: BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                for task_name, length in self._lengths.items()
+            }
+        norms = self._norms
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            weight = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * (BM25_K1 + 1)
+            for task_name, tf in postings.items():
+                scores[task_name] = scores.get(task_name, 0.0) + weight * tf / (tf + norms[task_name])
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
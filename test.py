@@ -6,6 +6,9 @@ from aiohttp import ClientSession
 
 from config import API_KEY
 from mistralai import Mistral
+from backends import get_agent_backend
+from usage_tracker import USAGE_TRACKER, mistral_usage
+from request_scheduler import SCHEDULER, HTTPStatusError
 
 logging.basicConfig(filename='workflow2.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -29,8 +32,9 @@ def encode_image(img_path):
         return base64.b64encode(image_file.read()).decode("utf-8")
 
 class AgentWorkflow:
-    def __init__(self, client):
+    def __init__(self, client, backend=None):
         self.client = client
+        self.backend = backend  # optional local stand-in for the Mistral endpoint (see backends.py)
 
     async def perform_task(self, agent_id, question, base64_image):
         url = "https://api.mistral.ai/v1/agents/completions"
@@ -39,15 +43,25 @@ class AgentWorkflow:
             "agent_id": agent_id,
             "messages": [{"role": "user", "content": [{"type": "text", "text": question}, {"type": "image_url", "image_url": f"data:image/jpeg;base64,{base64_image}"}]}]
         }
-        async with ClientSession() as session:
-            async with session.post(url, json=params, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logging.debug(f"API Response: {data}")
-                    return data['choices'][0]['message']['content'] if 'choices' in data and 'message' in data['choices'][0] else None
-                else:
-                    logging.error(f"HTTP error {response.status}: {await response.text()}")
-                    return None
+        async def post():
+            if self.backend is not None:
+                return await self.backend.agent_completion(agent_id, question, base64_image)
+            async with ClientSession() as session:
+                async with session.post(url, json=params, headers=headers) as response:
+                    if response.status != 200:
+                        raise HTTPStatusError(response.status, await response.text(), response.headers.get("Retry-After"))
+                    return await response.json()
+
+        try:
+            with USAGE_TRACKER.track("agent", "mistral-agent", agent_id) as call:
+                data = await SCHEDULER.call_async("mistral", post, usage=call)
+                call.model = data.get("model")
+                call.input_tokens, call.output_tokens = mistral_usage(data)
+        except HTTPStatusError as e:
+            logging.error(f"HTTP error {e}")
+            return None
+        logging.debug(f"API Response: {data}")
+        return data['choices'][0]['message']['content'] if 'choices' in data and 'message' in data['choices'][0] else None
 
     async def run_expert_agent(self, query, image):
         logging.info("Running Expert Agent")
@@ -87,7 +101,7 @@ async def main():
     initial_query = "Analyze the image and provide details."
 
     client = Mistral(api_key=API_KEY)
-    agent_workflow = AgentWorkflow(client)
+    agent_workflow = AgentWorkflow(client, backend=get_agent_backend())
 
     try:
         await agent_workflow.workflow(initial_query, base64_image)
@@ -96,6 +110,7 @@ async def main():
         print("Workflow execution failed. Check logs for details.")
     finally:
         logging.info("Workflow completed.")
+        USAGE_TRACKER.write_report("usage_report.json")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,52 @@
+import time
+import pytest
+from json_extract import iter_json_objects, extract_json_object
+
+TOOLS = '{"video_name": "clip_1", "tools": [{"object_name": "knife", "timestamp": "00:01"}]}'
+
+def test_pure_json_and_fenced():
+    assert extract_json_object(TOOLS, "tools")["video_name"] == "clip_1"
+    assert extract_json_object("```json\n" + TOOLS + "\n```", "tools")["video_name"] == "clip_1"
+
+def test_objects_between_prose_in_order():
+    text = 'Table first.\n{"a": 1}\nthen the tools:\n```json\n' + TOOLS + '\n```\nTask Summary: done {not json}'
+    documents = list(iter_json_objects(text))
+    assert documents[0] == {"a": 1}
+    assert documents[1]["video_name"] == "clip_1"
+    assert extract_json_object(text, "tools")["video_name"] == "clip_1"
+
+def test_braces_inside_strings_do_not_nest():
+    # Malformed (doubled quotes), so the end of the object is found by the brace scan
+    text = 'x {"note": "a } and a { ""quoted""", "tools": []} {"after": 1}'
+    assert extract_json_object(text, "tools")["tools"] == []
+    assert list(iter_json_objects(text))[-1] == {"after": 1}
+
+def test_doubled_quotes_are_repaired():
+    document = extract_json_object('prose {"tools": [{"action": "said ""stop"""}]} prose', "tools")
+    assert document is not None and document["tools"][0]["action"].startswith("said")
+
+def test_unclosed_brace_before_a_valid_object():
+    text = 'use { here, then ' + TOOLS + ' done'
+    assert extract_json_object(text, "tools")["video_name"] == "clip_1"
+
+def test_nested_unclosed_braces_keep_outermost_closed_objects():
+    text = '{ { {"a": {"b": 1}} {"c": 2}'
+    assert list(iter_json_objects(text)) == [{"a": {"b": 1}}, {"c": 2}]
+
+def test_truncated_response_does_not_fall_back_to_an_inner_record():
+    text = '```json\n{"video_name": "clip_1", "tools": [{"object_name": "knife"}, {"object_name": "tape"'
+    assert extract_json_object(text, "tools") is None
+
+def test_unclosed_braces_scan_in_linear_time():
+    timings = []
+    for count in (4000, 16000):
+        text = "x " + "{ " * count + TOOLS
+        start = time.perf_counter()
+        assert extract_json_object(text, "tools")["video_name"] == "clip_1"
+        timings.append(time.perf_counter() - start)
+    # Quadrupling the input must not take anywhere near 16 times as long
+    assert timings[1] < max(timings[0], 0.001) * 10
+
+def test_non_string_input():
+    with pytest.raises(ValueError):
+        list(iter_json_objects(None))
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+from stream_parser import ToolRecordStream, consume_stream
+
+RESPONSE = (
+    'Here is the table.\n| t | object |\n```json\n'
+    '{"video_name": "clip_1", "tools": [\n'
+    '  {"object_name": "knife", "action": "cut {tape}", "timestamp": "00:01"},\n'
+    '  {"object_name": "box", "action": "open \\"lid\\"", "timestamp": "00:05"}\n'
+    ']}\n```\nTask Summary: opened a box. End Summary.'
+)
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def test_records_are_emitted_as_they_complete():
+    seen = []
+    stream = ToolRecordStream(on_record=seen.append)
+    completed_per_chunk = [stream.feed(chunk) for chunk in chunks(RESPONSE, 7)]
+    assert [record["object_name"] for record in seen] == ["knife", "box"]
+    assert sum(len(completed) for completed in completed_per_chunk) == 2
+    assert stream.closed
+    assert stream.document["video_name"] == "clip_1"
+    assert stream.document["tools"][1]["action"] == 'open "lid"'
+    assert stream.first_record_after is not None
+
+def test_braces_in_prose_before_the_object_are_skipped():
+    stream = ToolRecordStream()
+    stream.feed('Use {this} as a guide. ' + RESPONSE)
+    assert stream.closed
+    assert len(stream.records) == 2
+
+def test_truncated_stream_does_not_close():
+    stream = ToolRecordStream()
+    stream.feed(RESPONSE[:RESPONSE.index('{"object_name": "box"') + 10])
+    assert not stream.closed
+    assert stream.document is None
+    assert [record["object_name"] for record in stream.records] == ["knife"]
+
+def test_reset_forgets_everything():
+    stream = ToolRecordStream()
+    stream.feed(RESPONSE)
+    stream.reset()
+    assert not stream.closed and stream.records == [] and stream.text == ""
+
+def test_consume_stream_cuts_off_the_tail():
+    response = [SimpleNamespace(text=chunk) for chunk in chunks(RESPONSE + "x" * 500, 16)]
+    stream = ToolRecordStream()
+    text = consume_stream(response, stream, max_tail_chars=100)
+    assert stream.closed
+    assert len(text) < len(RESPONSE) + 500
+    assert stream.tail_chars > 100
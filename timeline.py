@@ -0,0 +1,117 @@
+import re
+import logging
+import threading
+
+# Clips are cut at up to 90 s (segmentation.py); used when a clip's real duration cannot be read
+NOMINAL_CLIP_SECONDS = 90.0
+
+_CLOCK = r'(?:\d+:)?\d+:\d+(?:\.\d+)?|\d+(?:\.\d+)?\s*s?'
+_TIMESTAMP = re.compile(rf'^\s*({_CLOCK})\s*(?:(?:-|–|—|to)\s*({_CLOCK}))?\s*$', re.IGNORECASE)
+
+def _seconds(clock):
+    clock = clock.strip().rstrip('sS').strip()
+    seconds = 0.0
+    for part in clock.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def parse_timestamp(text):
+    """
+    Parses a model timestamp ("0:03", "00:00", "1:02:03.5", "12s", "0:03 - 0:06")
+    into (start, end) seconds; end equals start for a single point. Returns None
+    if the text is not a timestamp.
+    """
+    if text is None:
+        return None
+    match = _TIMESTAMP.match(str(text))
+    if not match:
+        return None
+    start = _seconds(match.group(1))
+    end = _seconds(match.group(2)) if match.group(2) else start
+    return (start, end) if end >= start else (end, start)
+
+def clip_duration(video_path, default=NOMINAL_CLIP_SECONDS):
+    """Returns a clip's duration in seconds, read with OpenCV if it is installed, else default."""
+    try:
+        import cv2
+    except ImportError:
+        return default
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    finally:
+        cap.release()
+    if fps and frames and fps > 0 and frames > 0:
+        return frames / fps
+    logging.warning(f"Could not read the duration of {video_path}, assuming {default}s")
+    return default
+
+class ClipTimeline:
+    """
+    Session time of each clip's first frame, for clips in the order of
+    find_and_sort_mp4_files. Durations are read lazily: a clip's offset only
+    needs the durations of the clips before it, so nothing is probed upfront.
+    """
+    def __init__(self, video_files=(), duration=clip_duration):
+        self.video_files = list(video_files)
+        self.duration = duration
+        self._offsets = {}
+        self._end = 0.0  # session time at which the last clip in _offsets starts
+        self._lock = threading.Lock()
+
+    def offset(self, clip):
+        """Returns the session time of the clip's first frame, or None for an unknown clip."""
+        with self._lock:
+            while clip not in self._offsets and len(self._offsets) < len(self.video_files):
+                if self._offsets:
+                    self._end += self.duration(self.video_files[len(self._offsets) - 1])
+                self._offsets[self.video_files[len(self._offsets)]] = self._end
+            return self._offsets.get(clip)
+
+# Identical observations of an object at most this many seconds apart are merged into one interval
+RLE_MAX_GAP_SECONDS = 6.0
+# Fields that must match for two observations to count as identical
+RLE_KEY_FIELDS = ["object_name", "object_type", "object_color", "object_size", "action"]
+
+def _format_clock(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    text = f"{seconds:05.2f}".rstrip('0').rstrip('.') if seconds % 1 else f"{int(seconds):02d}"
+    return f"{hours}:{minutes:02d}:{text}" if hours else f"{minutes}:{text}"
+
+def compress_observations(tools, max_gap=RLE_MAX_GAP_SECONDS):
+    """
+    Run-length compresses one clip's tool records: consecutive identical
+    observations of an object (same RLE_KEY_FIELDS, next one starting at most
+    max_gap seconds after the previous one ends) become a single record whose
+    timestamp is the "start - end" interval and whose samples field counts the
+    merged observations. Records without a parseable timestamp are kept as is.
+    With max_gap=None nothing is merged.
+    """
+    if max_gap is None:
+        return list(tools)
+    compressed = []
+    open_runs = {}  # object_name -> (key, record, end)
+    for tool in tools:
+        times = parse_timestamp(tool.get("timestamp"))
+        if times is None:
+            compressed.append(tool)
+            continue
+        key = tuple(tool.get(field, "") for field in RLE_KEY_FIELDS)
+        run = open_runs.get(key[0])
+        if run is not None and run[0] == key and 0 <= times[0] - run[2] <= max_gap:
+            record = run[1]
+            end = max(run[2], times[1])
+            record["samples"] += tool.get("samples", 1)
+            record["timestamp"] = f"{record['_start']} - {_format_clock(end)}"
+            open_runs[key[0]] = (key, record, end)
+            continue
+        record = dict(tool)
+        record["samples"] = tool.get("samples", 1)
+        record["_start"] = _format_clock(times[0])
+        compressed.append(record)
+        open_runs[key[0]] = (key, record, times[1])
+    for record in compressed:
+        record.pop("_start", None)
+    return compressed
@@ -0,0 +1,341 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import logging
+import threading
+import pandas as pd
+from timeline import parse_timestamp
+
+# Columns of the tool databank, one row per object
+DATABANK_COLUMNS = ["object_name", "object_type", "object_color", "object_size", "action", "timestamp", "status", "location", "video_name"]
+# Observation times in seconds: relative to the clip, and to the start of the session (clips in order)
+TIME_COLUMNS = ["clip_start_s", "clip_end_s", "session_start_s", "session_end_s"]
+# Columns of the event log besides its id; samples counts run-length merged observations
+EVENT_COLUMNS = ["recorded_at", "clip"] + DATABANK_COLUMNS + TIME_COLUMNS + ["samples"]
+# Columns of the legacy CSV databank DataFrame (gemini.py)
+FRAME_COLUMNS = ['timestamp', 'object', 'object_type', 'object_color', 'object_size', 'action', 'status', 'location']
+# Seconds between background compactions of the event log into the snapshot
+COMPACTION_INTERVAL = 5.0
+# SQLite's default limit on bound parameters per statement
+_MAX_SQL_PARAMS = 900
+
+def upsert_tool_frame(databank, new_tools, key="object"):
+    """
+    Upserts tool records into a databank DataFrame with one keyed lookup instead of a
+    mask and concat per record. Rows whose key is already known get the latest
+    timestamp and action and status "Normal"; unknown keys are appended once, with
+    their first description and location "Unknown". new_tools may be a DataFrame or
+    a list of dicts with object_name. Returns (databank, inserted, updated).
+    """
+    new = pd.DataFrame(new_tools)
+    if new.empty:
+        return databank, 0, 0
+    new = new.rename(columns={"object_name": key})
+    for column in ("object_type", "object_color", "object_size"):
+        new[column] = new[column].fillna("Unknown") if column in new else "Unknown"
+    latest = new.drop_duplicates(key, keep="last").set_index(key)
+
+    known = databank[key].isin(latest.index)
+    updated = int(known.sum())
+    if updated:
+        keys = databank.loc[known, key]
+        databank.loc[known, "timestamp"] = keys.map(latest["timestamp"])
+        databank.loc[known, "action"] = keys.map(latest["action"])
+        databank.loc[known, "status"] = "Normal"
+
+    added = new.drop_duplicates(key, keep="first")
+    added = added[~added[key].isin(databank[key])]
+    inserted = len(added)
+    if inserted:
+        added = added[[key, "object_type", "object_color", "object_size"]].assign(
+            timestamp=added[key].map(latest["timestamp"]).values,
+            action=added[key].map(latest["action"]).values,
+            status="Normal",
+            location="Unknown",
+        )
+        databank = pd.concat([databank, added[databank.columns.intersection(added.columns)]], ignore_index=True)
+    return databank, inserted, updated
+
+def _session_seconds(value):
+    if isinstance(value, str):
+        times = parse_timestamp(value)
+        if times is None:
+            raise ValueError(f"Not a time: {value}")
+        return times[0]
+    return float(value)
+
+class ToolDatabank:
+    """
+    Tool databank stored in SQLite. Every tool observation is appended to an
+    events table (the durable history); the tools table is a snapshot with one
+    row per object name (indexed on object name, video and timestamp) that is
+    brought up to date from the log by compact(), on reads and optionally in
+    a background thread. JSON and CSV files are exports, not the primary store.
+    """
+    def __init__(self, db_path, compaction_interval=COMPACTION_INTERVAL):
+        self.db_path = db_path
+        self.compaction_interval = compaction_interval
+        self._lock = threading.Lock()
+        self._con = None
+        self._compactor = None
+        self._stop = threading.Event()
+
+    def _connection(self):
+        if self._con is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._con = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._con.row_factory = sqlite3.Row
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS tools("
+                "object_name TEXT PRIMARY KEY, object_type TEXT, object_color TEXT, object_size TEXT, "
+                "action TEXT, timestamp TEXT, status TEXT, location TEXT, video_name TEXT)"
+            )
+            self._con.execute("CREATE INDEX IF NOT EXISTS idx_tools_video_name ON tools(video_name)")
+            self._con.execute("CREATE INDEX IF NOT EXISTS idx_tools_timestamp ON tools(timestamp)")
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS events("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, recorded_at REAL, clip TEXT, "
+                + ", ".join(f"{c} TEXT" for c in DATABANK_COLUMNS) + ", "
+                + ", ".join(f"{c} REAL" for c in TIME_COLUMNS) + ", samples INTEGER DEFAULT 1)"
+            )
+            self._con.execute("CREATE INDEX IF NOT EXISTS idx_events_object_name ON events(object_name)")
+            # Interval index over session time (R*Tree, so overlap queries are logarithmic)
+            self._con.execute("CREATE VIRTUAL TABLE IF NOT EXISTS event_times USING rtree(id, session_start, session_end)")
+            self._con.execute("CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value INTEGER)")
+            self._con.execute("INSERT OR IGNORE INTO meta(key, value) VALUES ('applied_event_id', 0)")
+            self._con.commit()
+        return self._con
+
+    def _rows(self, tools, video_name, status, clip, clip_offset):
+        if isinstance(tools, pd.DataFrame):
+            tools = tools.to_dict("records")
+        now = time.time()
+        rows = []
+        for tool in tools:
+            object_name = tool.get("object_name")
+            if not object_name:
+                logging.warning(f"Skipping tool record without object_name: {tool}")
+                continue
+            times = parse_timestamp(tool.get("timestamp"))
+            if times is None:
+                times = (None, None)
+            offset = tool.get("clip_offset", clip_offset)
+            rows.append((
+                now,
+                tool.get("clip", clip),
+                object_name,
+                tool.get("object_type", ""),
+                tool.get("object_color", ""),
+                tool.get("object_size", ""),
+                tool.get("action", ""),
+                tool.get("timestamp", ""),
+                tool.get("status", status),
+                tool.get("location", "Unknown"),
+                tool.get("video_name", video_name or "Unknown Video"),
+                times[0],
+                times[1],
+                None if offset is None or times[0] is None else offset + times[0],
+                None if offset is None or times[1] is None else offset + times[1],
+                tool.get("samples", 1),
+            ))
+        return rows
+
+    def _append(self, con, rows):
+        first = con.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        con.executemany(
+            "INSERT INTO events(" + ", ".join(EVENT_COLUMNS) + ") VALUES (" + ", ".join("?" * len(EVENT_COLUMNS)) + ")",
+            rows,
+        )
+        con.execute(
+            "INSERT INTO event_times(id, session_start, session_end) "
+            "SELECT id, session_start_s, session_end_s FROM events WHERE id > ? AND session_start_s IS NOT NULL",
+            (first,),
+        )
+
+    def _apply_pending(self, con):
+        """Applies events newer than the snapshot to it (caller holds the lock and the transaction)."""
+        applied = con.execute("SELECT value FROM meta WHERE key = 'applied_event_id'").fetchone()[0]
+        last = con.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        if last <= applied:
+            return 0
+        con.execute(
+            "INSERT INTO tools(" + ", ".join(DATABANK_COLUMNS) + ") "
+            "SELECT " + ", ".join(DATABANK_COLUMNS) + " FROM events WHERE id > ? AND id <= ? ORDER BY id "
+            "ON CONFLICT(object_name) DO UPDATE SET "
+            "object_type = COALESCE(NULLIF(excluded.object_type, ''), object_type), "
+            "object_color = COALESCE(NULLIF(excluded.object_color, ''), object_color), "
+            "object_size = COALESCE(NULLIF(excluded.object_size, ''), object_size), "
+            "action = excluded.action, timestamp = excluded.timestamp, "
+            "status = excluded.status, video_name = excluded.video_name, "
+            "location = COALESCE(NULLIF(NULLIF(excluded.location, ''), 'Unknown'), location)",
+            (applied, last),
+        )
+        con.execute("UPDATE meta SET value = ? WHERE key = 'applied_event_id'", (last,))
+        return last - applied
+
+    def append_events(self, tools, video_name=None, status="Normal", clip=None, clip_offset=None):
+        """
+        Appends tool observations to the event log in one transaction without
+        touching the snapshot. clip_offset is the session time at which the
+        clip starts (see timeline.ClipTimeline); without it observations are
+        not placed on the session timeline. Returns the number of events written.
+        """
+        rows = self._rows(tools, video_name, status, clip, clip_offset)
+        with self._lock:
+            con = self._connection()
+            with con:
+                self._append(con, rows)
+        return len(rows)
+
+    def upsert_tools(self, tools, video_name=None, status="Normal", clip=None, clip_offset=None):
+        """
+        Appends tool observations to the event log and applies them to the
+        snapshot in the same transaction: new objects are inserted and known
+        ones take the latest action, timestamp, status and video (descriptive
+        fields and location only when the new value is known). tools is a
+        list of dicts or a DataFrame of tool records from one clip or a whole
+        run. Returns (inserted, updated) counts of snapshot rows.
+        """
+        rows = self._rows(tools, video_name, status, clip, clip_offset)
+        names = list(dict.fromkeys(row[2] for row in rows))
+        with self._lock:
+            con = self._connection()
+            with con:
+                self._apply_pending(con)
+                known = 0
+                for start in range(0, len(names), _MAX_SQL_PARAMS):
+                    chunk = names[start:start + _MAX_SQL_PARAMS]
+                    known += con.execute(
+                        f"SELECT COUNT(*) FROM tools WHERE object_name IN ({', '.join('?' * len(chunk))})", chunk
+                    ).fetchone()[0]
+                self._append(con, rows)
+                self._apply_pending(con)
+        return len(names) - known, known
+
+    def compact(self):
+        """Brings the snapshot up to date with the event log. Returns the number of events applied."""
+        with self._lock:
+            con = self._connection()
+            with con:
+                applied = self._apply_pending(con)
+        if applied:
+            logging.info(f"Databank compacted {applied} events into the snapshot")
+        return applied
+
+    def rebuild_snapshot(self):
+        """Rebuilds the snapshot from the whole event log (e.g. after changing the merge rules)."""
+        with self._lock:
+            con = self._connection()
+            with con:
+                con.execute("DELETE FROM tools")
+                con.execute("UPDATE meta SET value = 0 WHERE key = 'applied_event_id'")
+                applied = self._apply_pending(con)
+        logging.info(f"Databank snapshot rebuilt from {applied} events")
+        return applied
+
+    def start_compaction(self):
+        """Starts a daemon thread that compacts the log every compaction_interval seconds."""
+        if self._compactor is None:
+            self._stop.clear()
+            self._compactor = threading.Thread(target=self._run_compaction, name="databank-compaction", daemon=True)
+            self._compactor.start()
+
+    def stop_compaction(self):
+        """Stops the background compaction thread and applies any remaining events."""
+        if self._compactor is not None:
+            self._stop.set()
+            self._compactor.join()
+            self._compactor = None
+        self.compact()
+
+    def _run_compaction(self):
+        while not self._stop.wait(self.compaction_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logging.error(f"Databank compaction failed: {str(e)}")
+
+    def history(self, object_name):
+        """Returns every logged observation of an object, oldest first."""
+        with self._lock:
+            rows = self._connection().execute("SELECT * FROM events WHERE object_name = ? ORDER BY id", (object_name,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def observations_between(self, start, end, object_name=None):
+        """
+        Returns logged observations overlapping [start, end] of session time
+        (seconds, or clock strings such as "12:30"), ordered by time, using the
+        interval index.
+        """
+        start, end = _session_seconds(start), _session_seconds(end)
+        sql = (
+            "SELECT events.* FROM event_times JOIN events ON events.id = event_times.id "
+            "WHERE event_times.session_start <= ? AND event_times.session_end >= ? "
+            "AND events.session_start_s <= ? AND events.session_end_s >= ?"
+        )
+        params = [end, start, end, start]
+        if object_name is not None:
+            sql += " AND events.object_name = ?"
+            params.append(object_name)
+        with self._lock:
+            rows = self._connection().execute(sql + " ORDER BY events.session_start_s, events.id", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def observations_of(self, object_name, start=None, end=None):
+        """Returns the logged observations of an object, optionally limited to a session time range, ordered by time."""
+        sql = "SELECT * FROM events WHERE object_name = ?"
+        params = [object_name]
+        if start is not None:
+            sql += " AND session_end_s >= ?"
+            params.append(_session_seconds(start))
+        if end is not None:
+            sql += " AND session_start_s <= ?"
+            params.append(_session_seconds(end))
+        with self._lock:
+            rows = self._connection().execute(sql + " ORDER BY session_start_s, id", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_tool(self, object_name):
+        """Returns the databank row for an object as a dict, or None."""
+        self.compact()
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM tools WHERE object_name = ?", (object_name,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def tools_for_video(self, video_name):
+        """Returns the rows last updated by a video, ordered by timestamp."""
+        self.compact()
+        with self._lock:
+            rows = self._connection().execute("SELECT * FROM tools WHERE video_name = ? ORDER BY timestamp", (video_name,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def all_tools(self):
+        """Returns every databank row as a dict, ordered by object name."""
+        self.compact()
+        with self._lock:
+            rows = self._connection().execute("SELECT * FROM tools ORDER BY object_name").fetchall()
+        return [dict(row) for row in rows]
+
+    def __len__(self):
+        self.compact()
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM tools").fetchone()[0]
+
+    def export_json(self, path):
+        """Writes the databank as {"tools": [...]} (the layout load_tool_info_from_json reads)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"tools": self.all_tools()}, f, indent=4, ensure_ascii=False)
+        logging.info(f"Databank exported to {path}")
+
+    def export_csv(self, path):
+        """Writes the databank as a CSV table."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=DATABANK_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.all_tools())
+        logging.info(f"Databank exported to {path}")
@@ -0,0 +1,74 @@
+import json
+
+# Fields of one tool record, in the order the databank and prompts use them
+TOOL_FIELDS = ["object_name", "object_type", "object_color", "object_size", "action", "timestamp"]
+
+# Response schema for JSON output mode (response_mime_type="application/json")
+TOOL_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "video_name": {"type": "string"},
+        "tools": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {field: {"type": "string"} for field in TOOL_FIELDS},
+                "required": TOOL_FIELDS,
+            },
+        },
+        "task_summary": {"type": "string"},
+    },
+    "required": ["video_name", "tools", "task_summary"],
+}
+
+class ToolRecord:
+    """One tool/object instance from a clip, with every field as a string."""
+    __slots__ = TOOL_FIELDS
+
+    def __init__(self, **fields):
+        for field in TOOL_FIELDS:
+            value = fields.get(field, "")
+            setattr(self, field, "" if value is None else str(value))
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a tool object, but got {type(data)}.")
+        return cls(**data)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in TOOL_FIELDS}
+
+def decode_tool_response(response_text):
+    """
+    Decodes a JSON-mode response into {"video_name", "tools", "task_summary"},
+    with tools as ToolRecord objects. Raises ValueError if it does not match the schema.
+    """
+    document = json.loads(response_text)
+    if not isinstance(document, dict) or not isinstance(document.get("tools"), list):
+        raise ValueError("Response does not match the tool schema")
+    return {
+        "video_name": str(document.get("video_name") or "Unknown Video"),
+        "tools": [ToolRecord.from_dict(tool) for tool in document["tools"]],
+        "task_summary": str(document.get("task_summary") or ""),
+    }
+
+def to_tool_info_json(decoded):
+    """Converts a decoded response to the {"video_name", "tools": [dict]} form used by the databank code."""
+    return {"video_name": decoded["video_name"], "tools": [tool.to_dict() for tool in decoded["tools"]]}
+
+def render_response_text(decoded):
+    """
+    Renders a decoded response in the layout of text-mode responses (a ```json
+    block followed by 'Task Summary:' ... 'End Summary.') so gemini_output.csv
+    and extract_summary work the same for both modes.
+    """
+    text = "```json\n" + json.dumps(to_tool_info_json(decoded), indent=4, ensure_ascii=False) + "\n```\n"
+    summary = decoded["task_summary"].strip()
+    if summary:
+        if not summary.startswith("Task Summary:"):
+            summary = "Task Summary:\n" + summary
+        if not summary.endswith("End Summary."):
+            summary += "\nEnd Summary."
+        text += "\n" + summary + "\n"
+    return text
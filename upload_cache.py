@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from request_scheduler import is_not_found
+
+UPLOAD_MANIFEST_FILE = os.path.expanduser("~/.cache/aria/upload_manifest.json")
+HASH_CHUNK_SIZE = 1024 * 1024
+# Uploads expiring within this many seconds are treated as expired, so they do not lapse mid-request
+UPLOAD_EXPIRY_MARGIN = 300
+
+def file_content_hash(path):
+    """Returns the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _expiration_timestamp(file):
+    """Returns the remote file's expiration as a unix timestamp, or None if unknown."""
+    expiration = getattr(file, "expiration_time", None)
+    if expiration is None:
+        return None
+    if isinstance(expiration, datetime):
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=timezone.utc)
+        return expiration.timestamp()
+    try:
+        return float(expiration)
+    except (TypeError, ValueError):
+        return None
+
+class UploadCache:
+    """
+    Local manifest of uploaded clips keyed by content hash.
+    Each entry maps a hash to the remote file name/uri and its expiry; a second
+    index maps local paths to (size, mtime, hash) so unchanged files are not re-hashed.
+    """
+    def __init__(self, manifest_path=UPLOAD_MANIFEST_FILE):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self.files = {}  # content hash -> {"name", "uri", "expires_at", "size"}
+        self.paths = {}  # local path -> {"size", "mtime", "hash"}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r') as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.paths = data.get("paths", {})
+        except Exception as e:
+            logging.warning(f"Upload manifest {self.manifest_path} could not be read, starting empty: {str(e)}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"files": self.files, "paths": self.paths}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def content_hash(self, path):
+        """Returns the content hash of a file, using size and mtime as a fast path."""
+        stat = os.stat(path)
+        with self._lock:
+            known = self.paths.get(path)
+        if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+            return known["hash"]
+        content_hash = file_content_hash(path)
+        with self._lock:
+            self.paths[path] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": content_hash}
+        return content_hash
+
+    def lookup(self, path):
+        """Returns the manifest entry for a local file unless it has expired (or expires within UPLOAD_EXPIRY_MARGIN), otherwise None."""
+        content_hash = self.content_hash(path)
+        with self._lock:
+            entry = self.files.get(content_hash)
+            if entry is None:
+                return None
+            expires_at = entry.get("expires_at")
+            if expires_at is not None and expires_at <= time.time() + UPLOAD_EXPIRY_MARGIN:
+                logging.info(f"Cached upload {entry['name']} for {path} has expired, evicting")
+                del self.files[content_hash]
+                self._save()
+                return None
+            return entry
+
+    def reuse(self, path, get_file):
+        """
+        Returns the still existing remote file for a local clip, or None if it must
+        be uploaded. Only a not-found answer evicts the entry; other get_file errors
+        are raised (pass a get_file that retries transient ones).
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return None
+        try:
+            file = get_file(entry["name"])
+        except Exception as e:
+            if not is_not_found(e):
+                raise
+            logging.info(f"Cached upload {entry['name']} for {path} is gone ({str(e)}), evicting")
+            self.evict(path)
+            return None
+        if file.state.name == "FAILED":
+            self.evict(path)
+            return None
+        logging.info(f"Reusing uploaded file {file.name} for {path}")
+        return file
+
+    def remember(self, path, file):
+        """Records a freshly uploaded remote file for a local clip."""
+        content_hash = self.content_hash(path)
+        with self._lock:
+            self.files[content_hash] = {
+                "name": file.name,
+                "uri": getattr(file, "uri", None),
+                "expires_at": _expiration_timestamp(file),
+                "size": self.paths[path]["size"],
+            }
+            self._save()
+
+    def evict(self, path):
+        """Drops the manifest entry for a local clip."""
+        content_hash = self.content_hash(path)
+        with self._lock:
+            if self.files.pop(content_hash, None) is not None:
+                self._save()
@@ -0,0 +1,132 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Estimated USD per 1M tokens (input, output); update when pricing changes
+MODEL_PRICES = {
+    "gemini-2.0-flash-thinking": (0.10, 0.40),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "pixtral-12b": (0.15, 0.15),
+    "open-mistral-nemo": (0.15, 0.15),
+}
+
+def model_price(model):
+    """Returns the (input, output) USD price per 1M tokens for a model, or None if unknown."""
+    name = model.split("/")[-1]
+    for prefix, price in MODEL_PRICES.items():
+        if name.startswith(prefix):
+            return price
+    return None
+
+def gemini_usage(response):
+    """Reads (input, output) token counts from a Gemini response's usage_metadata."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+def mistral_usage(data):
+    """Reads (input, output) token counts from the usage block of a Mistral JSON response."""
+    usage = (data or {}).get("usage") or {}
+    return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+
+class _Call:
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.retries = 0
+        self.model = None
+
+def _summarize(calls):
+    summary = {"calls": 0, "latency_s": 0.0, "input_tokens": 0, "output_tokens": 0, "retries": 0, "cost_usd": 0.0}
+    for call in calls:
+        summary["calls"] += 1
+        summary["latency_s"] += call["latency_s"]
+        summary["input_tokens"] += call["input_tokens"]
+        summary["output_tokens"] += call["output_tokens"]
+        summary["retries"] += call["retries"]
+        price = model_price(call["model"])
+        if price:
+            summary["cost_usd"] += (call["input_tokens"] * price[0] + call["output_tokens"] * price[1]) / 1e6
+    return summary
+
+class UsageTracker:
+    """
+    Records latency, tokens and retries for every model call, keyed by stage,
+    model and clip/agent, and builds a per-run report with cost estimates.
+    """
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, stage, model, key, latency, input_tokens=0, output_tokens=0, retries=0):
+        """Records one model call."""
+        with self._lock:
+            self.calls.append({
+                "stage": stage,
+                "model": model,
+                "key": key,
+                "latency_s": latency,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "retries": retries,
+            })
+        logging.info(f"{stage} [{key}] {model}: {latency:.2f}s, {input_tokens} input / {output_tokens} output tokens, {retries} retries")
+
+    @contextmanager
+    def track(self, stage, model, key):
+        """
+        Times a model call; set input_tokens/output_tokens/retries on the yielded
+        object (e.g. from gemini_usage or mistral_usage) before the block ends, and
+        model if the response names a more specific model than the one given.
+        """
+        call = _Call()
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            self.record(stage, call.model or model, key, time.perf_counter() - start, call.input_tokens, call.output_tokens, call.retries)
+
+    def report(self):
+        """Returns totals plus per-stage, per-model and per-key breakdowns with cost estimates."""
+        with self._lock:
+            calls = list(self.calls)
+
+        def grouped(field):
+            groups = {}
+            for call in calls:
+                groups.setdefault(call[field], []).append(call)
+            return {name: _summarize(group) for name, group in groups.items()}
+
+        return {
+            "totals": _summarize(calls),
+            "by_stage": grouped("stage"),
+            "by_model": grouped("model"),
+            "by_key": grouped("key"),
+        }
+
+    def usage_for(self, key, stage=None):
+        """Returns the summed usage of the calls recorded for a clip/agent (optionally one stage only)."""
+        with self._lock:
+            calls = [call for call in self.calls if call["key"] == key and (stage is None or call["stage"] == stage)]
+        return _summarize(calls)
+
+    def write_report(self, path):
+        """Writes the per-run report as JSON and logs the totals."""
+        report = self.report()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        totals = report["totals"]
+        logging.info(
+            f"Usage: {totals['calls']} calls, {totals['input_tokens']} input / {totals['output_tokens']} output tokens, "
+            f"{totals['latency_s']:.1f}s model time, estimated cost ${totals['cost_usd']:.6f}"
+        )
+        logging.info(f"Usage report saved to: {path}")
+        return report
+
+# Shared tracker for all model calls in this process
+USAGE_TRACKER = UsageTracker()
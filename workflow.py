@@ -3,6 +3,10 @@ import asyncio
 from localStoragePy import localStoragePy
 from mistralai import Mistral
 from aiohttp import ClientSession
+from backends import get_agent_backend
+from usage_tracker import USAGE_TRACKER, mistral_usage
+from request_scheduler import SCHEDULER, HTTPStatusError
+import os
 import re
 import logging
 import pandas as pd
@@ -43,9 +47,10 @@ central_database = {
 }
 
 class AgentWorkflow:
-    def __init__(self, csv_file_path):
+    def __init__(self, csv_file_path, backend=None):
         self.client_session = ClientSession()
         self.csv_file_path = csv_file_path
+        self.backend = backend  # optional local stand-in for the Mistral endpoint (see backends.py)
         
     async def read_csv_data(self):
         """Read data from a CSV file and update central database."""
@@ -97,15 +102,24 @@ class AgentWorkflow:
             ]
         }
         
-        async with self.client_session.post(url, json=params, headers=headers) as response:
-            data = await response.json()  # Directly parse the JSON response
-            logging.info(f"Response from {agent_id}: data: {data}")
-            if 'choices' in data and data['choices']:
-                return data['choices'][0]['message']['content']
-            else:
-                logging.error(f"Unexpected response format: {data}")
-                logging.error(f"HTTP error {response.status}: {await response.text()}")
-                raise ValueError("Invalid response format from API.")
+        async def post():
+            if self.backend is not None:
+                return await self.backend.agent_completion(agent_id, question, base64_image)
+            async with self.client_session.post(url, json=params, headers=headers) as response:
+                if response.status in (429, 500, 502, 503, 504):
+                    raise HTTPStatusError(response.status, await response.text(), response.headers.get("Retry-After"))
+                return await response.json()  # Directly parse the JSON response
+
+        with USAGE_TRACKER.track("agent", "mistral-agent", agent_id) as call:
+            data = await SCHEDULER.call_async("mistral", post, usage=call)
+            call.model = data.get("model")
+            call.input_tokens, call.output_tokens = mistral_usage(data)
+        logging.info(f"Response from {agent_id}: data: {data}")
+        if 'choices' in data and data['choices']:
+            return data['choices'][0]['message']['content']
+        else:
+            logging.error(f"Unexpected response format: {data}")
+            raise ValueError("Invalid response format from API.")
 
 
     async def run_expert_agent(self, query_expert, base64_image):
@@ -230,7 +244,7 @@ async def main():
     base64_image = encode_image(img)
     initial_query =(f"Analyse the image and tell me what is the object shown in highlight: the circle with star is the eye gaze point, which I am looking at the point, the highlighted area is the segmentation of the whole area of the object I am working with. The information of the picture is from the video frame of timestamp, the file name is the timestamp from path {img}, show me a table with one column timestamp, second column is object(the highlighted color area of segmentation with label) please detect and analyse the item or object, third column is the action prediction. Send these messages into the memory agent and give me the result in table and save it into central memory station." )
 
-    agent_workflow = AgentWorkflow(csv_file_path=csv_file_path)
+    agent_workflow = AgentWorkflow(csv_file_path=csv_file_path, backend=get_agent_backend())
 
     try:
         await agent_workflow.workflow(initial_query, base64_image)
@@ -239,6 +253,7 @@ async def main():
         print(f"Workflow execution failed: {e}. Please check the workflow.")
     finally:    
         await agent_workflow.close()
+        USAGE_TRACKER.write_report(os.path.join(os.path.dirname(csv_file_path), "usage_report.json"))
 
 if __name__ == "__main__":
     csv_file_path = '/mnt/Data/bosong/agent/log.csv'